@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from dateutil.relativedelta import relativedelta
-from typing import Any
+from typing import Any, Optional
 from fastapi import Depends, HTTPException, status, Request
 from backend_common.logging_wrapper import apply_decorator_to_module
 from fastapi.security import OAuth2PasswordBearer
@@ -16,19 +16,32 @@ from backend_common.dtypes.auth_dtypes import (
     UserProfileSettings
 )
 from backend_common.common_config import CONF
-from .background import get_background_tasks
+from backend_common.http_client import FirebaseHttpClient
+from backend_common.token_cache import id_token_cache
+from backend_common.token_verifier import TokenVerifierPool
+from backend_common.request_body import extract_user_id
+from backend_common.firestore_cache import (
+    CachePolicy,
+    CollectionCache,
+    read_snapshot,
+    thaw,
+    write_snapshot,
+)
+from backend_common.firestore_writes import WriteBehindQueue, diff_fields
+from backend_common.shared_cache import SharedCacheStore, SharedCollectionCache
+from backend_common.metrics import REGISTRY
+from backend_common.firebase_backend import get_backend, set_backend
 import random
-import requests
+import httpx
 import os
 import json
 import firebase_admin
-from firebase_admin import credentials, auth, firestore_async, firestore
+from firebase_admin import credentials, auth
+from google.cloud.firestore_v1.field_path import FieldPath
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import stripe
 import logging
-from google.oauth2 import service_account
 import asyncio
-from fastapi import BackgroundTasks
 import time
 
 logging.basicConfig(
@@ -38,54 +51,168 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+FIRESTORE_FETCH_SECONDS = REGISTRY.histogram(
+    "firestore_fetch_seconds", "Latency of Firestore reads made by FirestoreDB"
+)
+FIRESTORE_LISTENER_LAG_SECONDS = REGISTRY.histogram(
+    "firestore_listener_lag_seconds",
+    "Delay between a listener snapshot's read_time and its delivery",
+)
+FIRESTORE_LISTENER_APPLY_SECONDS = REGISTRY.histogram(
+    "firestore_listener_apply_seconds", "Time to apply one listener snapshot to the cache"
+)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 stripe.api_key = CONF.stripe_api_key
 
 
 class FirestoreDB:
-    def __init__(self, collections_to_listen: list[str]):
+    def __init__(
+        self,
+        collections_to_listen: list[str],
+        cache_policies: dict[str, CachePolicy] = None,
+        indexes: dict[str, list[str]] = None,
+    ):
         self._async_client = None
         self._sync_client = None
-        self._cache = {collection: {} for collection in collections_to_listen}
+        cache_policies = cache_policies or {}
+        indexes = indexes or {}
+        # With a shared cache path, unbounded collections live in one SQLite
+        # store per host, filled by whichever worker holds the leader lock
+        self._shared_store = (
+            SharedCacheStore(CONF.firestore_shared_cache_path)
+            if CONF.firestore_shared_cache_path
+            else None
+        )
+        self._shared_leader_task = None
+        self._cache = {}
+        for collection in collections_to_listen:
+            policy = cache_policies.get(collection) or CachePolicy()
+            if self._shared_store is not None and not policy.bounded:
+                self._cache[collection] = SharedCollectionCache(
+                    self._shared_store, collection, policy, indexes.get(collection, ())
+                )
+            else:
+                self._cache[collection] = CollectionCache(
+                    policy, indexes.get(collection, ())
+                )
         self._collection_listeners = {}
         self._collections_to_listen = collections_to_listen
+        # Per-collection readiness and warm-up progress (documents loaded)
+        self._ready = {collection: asyncio.Event() for collection in collections_to_listen}
+        self._warmup_progress = {collection: 0 for collection in collections_to_listen}
+        # Read time each cached collection is consistent with, and the read
+        # time of snapshots restored from disk awaiting their first listener event
+        self._read_times = {}
+        self._restored_read_times = {}
+        self._snapshot_task = None
+        # In-flight cache-miss fetches keyed by (collection, doc_id), and the
+        # number of get_document calls that joined one instead of fetching
+        self._inflight = {}
+        self._coalesced = {collection: 0 for collection in collections_to_listen}
+        # Per-collection snapshot apply counters and latency
+        self._listener_stats = {
+            collection: {
+                "snapshots": 0,
+                "changes": 0,
+                "last_apply_ms": 0.0,
+                "max_apply_ms": 0.0,
+                "total_apply_ms": 0.0,
+            }
+            for collection in collections_to_listen
+        }
+        # Wall-clock time of the last snapshot per collection, for stall alerts
+        self._last_snapshot_at = {}
+        REGISTRY.register_collector(self._collect_metrics)
+        # Coalesced document writes, flushed in batches by a background task
+        self._writes = WriteBehindQueue(
+            self.get_async_client,
+            max_batch=CONF.firestore_write_batch_size,
+            flush_interval=CONF.firestore_write_flush_interval,
+        )
 
     def get_async_client(self):
         if self._async_client is None:
-            google_auth_creds = service_account.Credentials.from_service_account_file(
-                CONF.firebase_sp_path
-            )
-            self._async_client = firestore_async.AsyncClient(
-                credentials=google_auth_creds
-            )
+            self._async_client = get_backend().firestore_async_client()
         return self._async_client
 
     def get_sync_client(self):
         if self._sync_client is None:
-            self._sync_client = firestore.Client.from_service_account_json(
-                CONF.firebase_sp_path
-            )
+            self._sync_client = get_backend().firestore_sync_client()
         return self._sync_client
 
     def setup_collection_listener(self, collection_name: str):
         """Synchronous setup of collection listener"""
         if collection_name not in self._collection_listeners:
             collection_ref = self.get_sync_client().collection(collection_name)
+            cache = self._cache[collection_name]
+
+            batched = CONF.firestore_listener_mode == "batched"
 
             def on_snapshot(col_snapshot, changes, read_time):
+                started = time.perf_counter()
+                self._last_snapshot_at[collection_name] = time.time()
+                if isinstance(read_time, datetime):
+                    FIRESTORE_LISTENER_LAG_SECONDS.observe(
+                        max(time.time() - read_time.timestamp(), 0.0),
+                        collection=collection_name,
+                    )
+                upserts, removals = {}, []
+                restored_at = self._restored_read_times.pop(collection_name, None)
+                if restored_at is not None:
+                    # First event after restoring from disk: drop documents
+                    # deleted while we were down
+                    live_ids = {doc.id for doc in col_snapshot}
+                    removals.extend(d for d in cache if d not in live_ids)
                 for change in changes:
                     doc_id = change.document.id
                     if change.type.name in ["ADDED", "MODIFIED"]:
-                        data = change.document.to_dict()
-                        self._cache[collection_name][doc_id] = data
-                        logger.info(
-                            f"Cache updated for {collection_name} document {doc_id}"
-                        )
+                        # Unchanged since the restored snapshot
+                        update_time = change.document.update_time
+                        if (
+                            restored_at is not None
+                            and update_time is not None
+                            and update_time <= restored_at
+                            and doc_id in cache
+                        ):
+                            continue
+                        upserts[doc_id] = change.document.to_dict()
                     elif change.type.name == "REMOVED":
-                        self._cache[collection_name].pop(doc_id, None)
+                        removals.append(doc_id)
+
+                # Bounded caches only refresh documents they already hold
+                if batched:
+                    updated, removed = cache.apply_batch(
+                        upserts, removals, only_cached=cache.policy.bounded
+                    )
+                else:
+                    updated = removed = 0
+                    for doc_id in removals:
+                        if cache.pop(doc_id, None) is not None:
+                            removed += 1
+                            logger.info(
+                                f"Removed {collection_name} document {doc_id} from cache"
+                            )
+                    for doc_id, data in upserts.items():
+                        cache.clear_missing(doc_id)
+                        if cache.policy.bounded and doc_id not in cache:
+                            continue
+                        cache[doc_id] = data
+                        updated += 1
                         logger.info(
-                            f"Removed {collection_name} document {doc_id} from cache"
+                            f"Cache updated for {collection_name} document {doc_id}"
                         )
+                self._read_times[collection_name] = read_time
+                if isinstance(cache, SharedCollectionCache):
+                    cache.mark_ready(read_time)
+                self._record_snapshot_apply(
+                    collection_name,
+                    len(changes),
+                    updated,
+                    removed,
+                    (time.perf_counter() - started) * 1000,
+                    log_summary=batched,
+                )
 
             # Watch the collection
             self._collection_listeners[collection_name] = collection_ref.on_snapshot(
@@ -93,49 +220,461 @@ class FirestoreDB:
             )
             logger.info(f"Started listener for collection {collection_name}")
 
+    def _record_snapshot_apply(
+        self,
+        collection_name: str,
+        change_count: int,
+        updated: int,
+        removed: int,
+        elapsed_ms: float,
+        log_summary: bool,
+    ):
+        stats = self._listener_stats[collection_name]
+        stats["snapshots"] += 1
+        stats["changes"] += change_count
+        stats["last_apply_ms"] = elapsed_ms
+        stats["max_apply_ms"] = max(stats["max_apply_ms"], elapsed_ms)
+        stats["total_apply_ms"] += elapsed_ms
+        FIRESTORE_LISTENER_APPLY_SECONDS.observe(elapsed_ms / 1000, collection=collection_name)
+        if log_summary and (change_count or removed):
+            logger.info(
+                f"Applied {collection_name} snapshot: {change_count} changes, "
+                f"{updated} cached, {removed} removed in {elapsed_ms:.1f}ms"
+            )
+
+    def listener_stats(self) -> dict:
+        """Snapshot count, change count and apply latency per listened collection"""
+        return {
+            name: {
+                **stats,
+                "avg_apply_ms": (
+                    stats["total_apply_ms"] / stats["snapshots"] if stats["snapshots"] else 0.0
+                ),
+            }
+            for name, stats in self._listener_stats.items()
+        }
+
     async def get_document(self, collection_name: str, doc_id: str) -> dict:
         if collection_name not in self._cache:
             raise ValueError(f"Collection {collection_name} is not being monitored")
 
-        if doc_id in self._cache[collection_name]:
-            logger.info(f"Retrieved {collection_name} document {doc_id} from cache")
-            return self._cache[collection_name][doc_id]
+        cached = self._cache[collection_name].get(doc_id)
+        if cached is not None:
+            return cached
+        if self._cache[collection_name].is_known_missing(doc_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document not found in {collection_name}",
+            )
+
+        # Concurrent misses for the same document share one fetch. The fetch
+        # runs as its own task and is shielded, so a cancelled caller does not
+        # cancel it for the others; its result or error reaches every caller.
+        key = (collection_name, doc_id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_document(collection_name, doc_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish_fetch(key, t))
+        else:
+            self._coalesced[collection_name] += 1
+        return await asyncio.shield(task)
+
+    async def get_documents(
+        self, collection_name: str, doc_ids: list[str]
+    ) -> list[Optional[dict]]:
+        """
+        Fetches many documents, answering from cache where possible and
+        fetching the misses with batched get_all round trips
+        (CONF.firestore_get_all_batch_size ids per batch, at most
+        CONF.firestore_get_all_concurrency batches in flight).
+
+        Returns the documents in input order, None for missing ones.
+        """
+        if collection_name not in self._cache:
+            raise ValueError(f"Collection {collection_name} is not being monitored")
+
+        cache = self._cache[collection_name]
+        results = {}
+        inflight = {}
+        to_fetch = []
+        for doc_id in dict.fromkeys(doc_ids):
+            cached = cache.get(doc_id)
+            if cached is not None:
+                results[doc_id] = cached
+            elif cache.is_known_missing(doc_id):
+                results[doc_id] = None
+            elif (collection_name, doc_id) in self._inflight:
+                # Join a get_document fetch that is already running
+                inflight[doc_id] = self._inflight[(collection_name, doc_id)]
+            else:
+                to_fetch.append(doc_id)
+
+        client = self.get_async_client()
+        collection_ref = client.collection(collection_name)
+        semaphore = asyncio.Semaphore(CONF.firestore_get_all_concurrency)
+
+        async def fetch_batch(batch: list[str]):
+            async with semaphore:
+                refs = [collection_ref.document(doc_id) for doc_id in batch]
+                started = time.perf_counter()
+                async for doc in client.get_all(refs):
+                    if doc.exists:
+                        # Callers get what a later cache hit returns
+                        results[doc.id] = cache.put(doc.id, doc.to_dict())
+                    else:
+                        cache.mark_missing(doc.id)
+                        results[doc.id] = None
+                FIRESTORE_FETCH_SECONDS.observe(
+                    time.perf_counter() - started, collection=collection_name, op="get_all"
+                )
 
+        async def join_fetch(doc_id: str, task: asyncio.Task):
+            try:
+                results[doc_id] = await asyncio.shield(task)
+            except HTTPException as e:
+                if e.status_code != status.HTTP_404_NOT_FOUND:
+                    raise
+                results[doc_id] = None
+
+        batch_size = CONF.firestore_get_all_batch_size
+        await asyncio.gather(
+            *(
+                fetch_batch(to_fetch[i : i + batch_size])
+                for i in range(0, len(to_fetch), batch_size)
+            ),
+            *(join_fetch(doc_id, task) for doc_id, task in inflight.items()),
+        )
+        return [results.get(doc_id) for doc_id in doc_ids]
+
+    def declare_index(self, collection_name: str, field_path: str):
+        """Adds an in-memory secondary index on a cached collection"""
+        self._cache[collection_name].add_index(field_path)
+
+    def find_documents(self, collection_name: str, field_path: str, value: Any) -> list[dict]:
+        """
+        Cached documents whose (dotted) field equals value, via a secondary
+        index instead of a full scan. Complete for listener-mirrored
+        collections; bounded caches only return what they currently hold.
+        """
+        if collection_name not in self._cache:
+            raise ValueError(f"Collection {collection_name} is not being monitored")
+        cache = self._cache[collection_name]
+        if field_path not in cache.indexes:
+            raise ValueError(f"No index on {collection_name}.{field_path}")
+        return cache.lookup(field_path, value)
+
+    def _finish_fetch(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the error as retrieved even if every caller was cancelled
+            task.exception()
+
+    async def _fetch_document(self, collection_name: str, doc_id: str) -> dict:
         doc_ref = self.get_async_client().collection(collection_name).document(doc_id)
+        started = time.perf_counter()
         doc = await doc_ref.get()
+        FIRESTORE_FETCH_SECONDS.observe(
+            time.perf_counter() - started, collection=collection_name, op="get"
+        )
 
         if not doc.exists:
+            self._cache[collection_name].mark_missing(doc_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Document not found in {collection_name}",
             )
 
-        data = doc.to_dict()
-        self._cache[collection_name][doc_id] = data
-        return data
+        # Same form (e.g. frozen) as a later cache hit returns
+        return self._cache[collection_name].put(doc_id, doc.to_dict())
+
+    async def get_document_or_default(
+        self, collection_name: str, doc_id: str, default: Any = None
+    ) -> Any:
+        """get_document, returning default instead of raising 404"""
+        try:
+            return await self.get_document(collection_name, doc_id)
+        except HTTPException as e:
+            if e.status_code == status.HTTP_404_NOT_FOUND:
+                return default
+            raise
+
+    def enqueue_set(self, collection_name: str, doc_id: str, data: dict):
+        """Queues a write-behind set of the whole document"""
+        self._writes.enqueue_set(collection_name, doc_id, data)
+
+    def enqueue_update(self, collection_name: str, doc_id: str, fields: dict):
+        """Queues a write-behind update of the given fields"""
+        self._writes.enqueue_update(collection_name, doc_id, fields)
+
+    async def flush_writes(self):
+        """Writes every queued document write now"""
+        await self._writes.flush()
+
+    async def drain_writes(self):
+        """Stops the write-behind flusher and writes what is still queued"""
+        await self._writes.close()
+
+    def write_stats(self) -> dict:
+        return self._writes.stats()
+
+    def _collect_metrics(self):
+        """Cache, listener and write-queue counters for the metrics registry"""
+        now = time.time()
+        for name, stats in self.cache_stats().items():
+            labels = {"collection": name}
+            yield "firestore_cache_hits_total", "counter", "Cache hits", labels, stats["hits"]
+            yield "firestore_cache_misses_total", "counter", "Cache misses", labels, stats["misses"]
+            yield (
+                "firestore_cache_negative_hits_total", "counter",
+                "Reads answered by the negative cache", labels, stats["negative_hits"],
+            )
+            yield (
+                "firestore_cache_evictions_total", "counter",
+                "Documents evicted by the cache policy", labels, stats["evictions"],
+            )
+            yield (
+                "firestore_cache_coalesced_total", "counter",
+                "Cache misses that joined an in-flight fetch", labels, stats["coalesced"],
+            )
+            yield "firestore_cache_entries", "gauge", "Cached documents", labels, stats["size"]
+            if stats["bytes"] is not None:
+                yield (
+                    "firestore_cache_bytes", "gauge",
+                    "Estimated bytes held by the cache", labels, stats["bytes"],
+                )
+            if name in self._last_snapshot_at:
+                yield (
+                    "firestore_listener_last_snapshot_age_seconds", "gauge",
+                    "Seconds since the listener last delivered a snapshot",
+                    labels, now - self._last_snapshot_at[name],
+                )
+        write_stats = self.write_stats()
+        yield (
+            "firestore_write_queue_pending", "gauge",
+            "Documents with a queued write-behind write", {}, write_stats["pending"],
+        )
+        yield (
+            "firestore_writes_total", "counter",
+            "Documents written by the write-behind queue", {}, write_stats["written"],
+        )
+        yield (
+            "firestore_write_failures_total", "counter",
+            "Write-behind writes that failed", {}, write_stats["failed"],
+        )
+
+    def cache_stats(self) -> dict:
+        """Size, eviction, hit-ratio and coalescing counters per cached collection"""
+        return {
+            name: {**cache.stats(), "coalesced": self._coalesced.get(name, 0)}
+            for name, cache in self._cache.items()
+        }
+
+    def is_ready(self, collection_name: str = None) -> bool:
+        """Whether one collection (or, by default, every collection) is warmed up"""
+        if collection_name is not None:
+            return self._ready[collection_name].is_set()
+        return all(event.is_set() for event in self._ready.values())
+
+    async def wait_until_ready(self, collection_name: str, timeout: float = None):
+        await asyncio.wait_for(self._ready[collection_name].wait(), timeout)
+
+    def warmup_progress(self) -> dict:
+        """Documents loaded so far and readiness per collection"""
+        return {
+            name: {"loaded": loaded, "ready": self._ready[name].is_set()}
+            for name, loaded in self._warmup_progress.items()
+        }
 
     async def initialize_collection_cache(self, collection_name: str):
-        collection_ref = self.get_async_client().collection(collection_name)
-        docs = await collection_ref.get()
-        for doc in docs:
-            self._cache[collection_name][doc.id] = doc.to_dict()
+        """
+        Streams a collection into the cache page by page, ordered by
+        document id, so only one page is materialized at a time.
+        """
+        cache = self._cache[collection_name]
+        if cache.policy.bounded:
+            # Bounded caches fill on demand instead of loading everything
+            logger.info(f"Skipping warm-up for bounded cache {collection_name}")
+            return
+        warmup_started_at = datetime.now(timezone.utc)
+        page_size = CONF.firestore_warmup_page_size
+        query = (
+            self.get_async_client()
+            .collection(collection_name)
+            .order_by(FieldPath.document_id())
+            .limit(page_size)
+        )
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc else query
+            started = time.perf_counter()
+            docs = [doc async for doc in page.stream()]
+            FIRESTORE_FETCH_SECONDS.observe(
+                time.perf_counter() - started, collection=collection_name, op="warmup_page"
+            )
+            # One lock hold (or shared-store transaction) per page
+            cache.apply_batch({doc.id: doc.to_dict() for doc in docs})
+            self._warmup_progress[collection_name] += len(docs)
+            if len(docs) < page_size:
+                break
+            last_doc = docs[-1]
+            logger.info(
+                f"Warming cache for {collection_name}: "
+                f"{self._warmup_progress[collection_name]} documents loaded"
+            )
+        self._read_times.setdefault(collection_name, warmup_started_at)
         logger.info(
-            f"Initialized cache for {collection_name} with {len(docs)} documents"
+            f"Initialized cache for {collection_name} with "
+            f"{self._warmup_progress[collection_name]} documents"
         )
 
-    async def initialize_all(self):
-        """Initialize all caches and setup listeners"""
-        # Initialize caches asynchronously
-        for collection_name in self._collections_to_listen:
-            await self.initialize_collection_cache(collection_name)
+    def _snapshot_path(self, collection_name: str) -> str:
+        return os.path.join(CONF.firestore_snapshot_dir, f"{collection_name}.snapshot")
+
+    def _snapshot_enabled(self, collection_name: str) -> bool:
+        # Bounded caches only hold part of a collection, so they are not
+        # persisted; the shared store is its own persistence
+        cache = self._cache[collection_name]
+        return (
+            bool(CONF.firestore_snapshot_dir)
+            and not cache.policy.bounded
+            and not isinstance(cache, SharedCollectionCache)
+        )
+
+    def save_snapshot(self, collection_name: str):
+        """Persists a cached collection and its read time to local disk"""
+        if not self._snapshot_enabled(collection_name):
+            return
+        read_time = self._read_times.get(collection_name)
+        if read_time is None:
+            return
+        documents = dict(self._cache[collection_name].items())
+        write_snapshot(
+            self._snapshot_path(collection_name), collection_name, documents, read_time
+        )
+        logger.info(f"Saved snapshot of {collection_name} with {len(documents)} documents")
+
+    def save_all_snapshots(self):
+        for collection_name in self._cache:
+            try:
+                self.save_snapshot(collection_name)
+            except OSError as e:
+                logger.warning(f"Failed to save snapshot of {collection_name}: {e}")
+
+    def load_snapshot(self, collection_name: str) -> bool:
+        """
+        Bulk-loads a persisted snapshot into the cache. The listener then only
+        applies documents updated after the snapshot's read time.
+        """
+        if not self._snapshot_enabled(collection_name):
+            return False
+        payload = read_snapshot(self._snapshot_path(collection_name), collection_name)
+        if payload is None:
+            return False
+        cache = self._cache[collection_name]
+        for doc_id, data in payload["documents"].items():
+            cache[doc_id] = data
+        self._warmup_progress[collection_name] = len(payload["documents"])
+        self._read_times[collection_name] = payload["read_time"]
+        self._restored_read_times[collection_name] = payload["read_time"]
+        logger.info(
+            f"Restored {collection_name} from snapshot with "
+            f"{len(payload['documents'])} documents as of {payload['read_time']}"
+        )
+        return True
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(CONF.firestore_snapshot_interval)
+            await asyncio.get_running_loop().run_in_executor(None, self.save_all_snapshots)
+
+    def _restore_shared(self, collection_name: str) -> bool:
+        """Resumes from documents a previous leader published to the shared store"""
+        cache = self._cache[collection_name]
+        read_time = cache.read_time() if cache.is_published() else None
+        if read_time is None:
+            return False
+        self._warmup_progress[collection_name] = len(cache)
+        self._read_times[collection_name] = read_time
+        self._restored_read_times[collection_name] = read_time
+        logger.info(
+            f"Resuming shared cache of {collection_name} with "
+            f"{self._warmup_progress[collection_name]} documents as of {read_time}"
+        )
+        return True
+
+    async def _wait_for_shared(self, collection_name: str) -> bool:
+        """
+        Waits for the leader to publish a shared collection. Returns False
+        once it is readable, or True when this worker took over the leader
+        lock meanwhile (the leader exited before publishing) and has to load
+        the collection itself.
+        """
+        cache = self._cache[collection_name]
+        while not cache.is_published():
+            if self._shared_store.try_acquire_leadership():
+                logger.info(f"Took over loading {collection_name} for the shared cache")
+                return True
+            await asyncio.sleep(CONF.firestore_shared_cache_poll_interval)
+        self._warmup_progress[collection_name] = len(cache)
+        self._ready[collection_name].set()
+        logger.info(f"Reading {collection_name} from the shared cache")
+        return False
+
+    async def _shared_leader_loop(self):
+        """Takes over the listeners of shared collections if the leader exits"""
+        while not self._shared_store.try_acquire_leadership():
+            await asyncio.sleep(CONF.firestore_shared_cache_poll_interval)
+        loop = asyncio.get_running_loop()
+        for collection_name, cache in self._cache.items():
+            if isinstance(cache, SharedCollectionCache):
+                await loop.run_in_executor(None, self._restore_shared, collection_name)
+                await loop.run_in_executor(
+                    None, self.setup_collection_listener, collection_name
+                )
 
-        # Setup listeners synchronously in a thread
-        def setup_listeners():
-            for collection_name in self._collections_to_listen:
-                self.setup_collection_listener(collection_name)
+    async def _initialize_collection(self, collection_name: str):
+        loop = asyncio.get_running_loop()
+        if isinstance(self._cache[collection_name], SharedCollectionCache):
+            if not self._shared_store.is_leader and not await self._wait_for_shared(
+                collection_name
+            ):
+                # Another worker owns the listener
+                return
+            loaded = await loop.run_in_executor(
+                None, self._restore_shared, collection_name
+            )
+        else:
+            loaded = await loop.run_in_executor(
+                None, self.load_snapshot, collection_name
+            )
+        if not loaded:
+            await self.initialize_collection_cache(collection_name)
+            if isinstance(self._cache[collection_name], SharedCollectionCache):
+                self._cache[collection_name].mark_ready(
+                    self._read_times[collection_name]
+                )
+        self._ready[collection_name].set()
+        # Setup the listener synchronously in a thread
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.setup_collection_listener, collection_name
+        )
 
-        # Run synchronous listeners setup in a thread
-        await asyncio.get_event_loop().run_in_executor(None, setup_listeners)
+    async def initialize_all(self):
+        """Initialize all caches and setup listeners, one collection per task"""
+        if self._shared_store is not None:
+            self._shared_store.try_acquire_leadership()
+        await asyncio.gather(
+            *(
+                self._initialize_collection(collection_name)
+                for collection_name in self._collections_to_listen
+            )
+        )
+        if CONF.firestore_snapshot_dir and CONF.firestore_snapshot_interval > 0:
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+        if self._shared_store is not None and not self._shared_store.is_leader:
+            self._shared_leader_task = asyncio.create_task(self._shared_leader_loop())
 
     def cleanup(self):
         """Synchronous cleanup of listeners with proper thread shutdown"""
@@ -147,9 +686,25 @@ class FirestoreDB:
         # Give threads time to exit gracefully
         time.sleep(1)  # Wait for threads to process unsubscribe
 
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+        if self._shared_leader_task:
+            self._shared_leader_task.cancel()
+        REGISTRY.unregister_collector(self._collect_metrics)
+        if self._writes.pending_count:
+            logger.warning(
+                f"{self._writes.pending_count} queued Firestore writes were not "
+                "drained before cleanup; await drain_writes() first"
+            )
+        # Persist caches for the next cold start
+        self.save_all_snapshots()
+
         # Clear collections
         self._collection_listeners.clear()
         self._cache.clear()
+        if self._shared_store is not None:
+            # Releases the leader lock so another worker takes over
+            self._shared_store.close()
 
         # Close clients
         if self._async_client:
@@ -158,19 +713,33 @@ class FirestoreDB:
             self._sync_client.close()
 
 db = None
-# Initialize Firebase admin with firebase credentials
-if os.path.exists(CONF.firebase_sp_path):
+if CONF.firebase_backend == "fake":
+    # In-process Firestore / Identity Toolkit for offline runs and benchmarks
+    from backend_common.fake_firebase import FakeFirebaseBackend
+
+    set_backend(FakeFirebaseBackend.from_config())
+elif os.path.exists(CONF.firebase_sp_path):
+    # Initialize Firebase admin with firebase credentials
     firebase_creds = credentials.Certificate(CONF.firebase_sp_path)
     default_app = firebase_admin.initialize_app(firebase_creds)
-    # Create Firestore client with google-auth credentials
-    db = FirestoreDB(CONF.firestore_collections)
+if CONF.firebase_backend == "fake" or os.path.exists(CONF.firebase_sp_path):
+    db = FirestoreDB(
+        CONF.firestore_collections,
+        {
+            name: CachePolicy.from_config(config)
+            for name, config in CONF.firestore_cache_policies.items()
+        },
+        CONF.firestore_indexes,
+    )
 
 
 class JWTBearer(HTTPBearer):
     """This class is to make endpoints secure with JWT"""
 
-    def __init__(self, auto_error: bool = True):
+    def __init__(self, auto_error: bool = True, check_revoked: bool = False):
         super(JWTBearer, self).__init__(auto_error=auto_error)
+        # Revocation-checked endpoints always bypass the verified-token cache
+        self.check_revoked = check_revoked
 
     async def __call__(self, request: Request):
         self.request = request
@@ -191,32 +760,17 @@ class JWTBearer(HTTPBearer):
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
     async def verify_jwt(self, jwt_token: str) -> bool:
-        decoded_token = my_verify_id_token(jwt_token)
+        decoded_token = await verify_firebase_id_token_async(
+            jwt_token, check_revoked=self.check_revoked
+        )
         token_user_id = decoded_token["uid"]
 
-        # Handle both JSON and form data
-        content_type = self.request.headers.get("content-type", "")
-
-        if "multipart/form-data" in content_type:
-            # For multipart form data, get the form first
-            form = await self.request.form()
-            # Check if there's a JSON string in the form data
-            if "data" in form:
-                try:
-                    request_data = json.loads(form["data"])
-                    user_id = request_data.get("request_body", {}).get("user_id")
-                except json.JSONDecodeError:
-                    return False
-            else:
-                # Direct form fields
-                user_id = form.get("user_id")
-        else:
-            # Regular JSON request
-            try:
-                request_body = await self.request.json()
-                user_id = request_body.get("user_id")
-            except json.JSONDecodeError:
-                return False
+        # Handle both JSON and form data; the parsed body is cached on
+        # request.state, and endpoints reuse it via request_body.cached_body
+        try:
+            user_id = await extract_user_id(self.request)
+        except json.JSONDecodeError:
+            return False
 
         if user_id and token_user_id != user_id:
             return False
@@ -226,7 +780,7 @@ class JWTBearer(HTTPBearer):
 async def create_firebase_user(req: ReqCreateFirebaseUser) -> dict[str, Any]:
     try:
         # Create user in Firebase
-        user = auth.create_user(
+        user = get_backend().admin_auth().create_user(
             email=req.email, password=req.password, display_name=req.username
         )
 
@@ -263,7 +817,9 @@ async def login_user(req: ReqUserLogin) -> dict[str, Any]:
         )
         response["created_at"] = datetime.now()
         if response.get("localId", "") != "":
-            user = auth.get_user(response["localId"])
+            user = await asyncio.to_thread(
+                get_backend().admin_auth().get_user, response["localId"]
+            )
             if user.email_verified:
                 return response
             else:
@@ -301,20 +857,58 @@ async def refresh_id_token(req: ReqRefreshToken) -> dict[str, Any]:
 
 
 def my_verify_id_token(token: str = Depends(oauth2_scheme)):
+    return verify_firebase_id_token(token)
+
+
+def verify_firebase_id_token(token: str, check_revoked: bool = False) -> dict:
+    """
+    Verifies a Firebase ID token, answering from the verified-token cache
+    when possible. Revocation checks always go to Firebase and refresh
+    the cached claims.
+    """
+    check_revoked = check_revoked or CONF.id_token_check_revoked
+    claims = None if check_revoked else id_token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
-        return auth.verify_id_token(token)
-    except auth.InvalidIdTokenError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"invalid access token={token}",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from e
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token format",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from e
+        claims = get_backend().admin_auth().verify_id_token(
+            token, check_revoked=check_revoked
+        )
+    except (auth.InvalidIdTokenError, ValueError) as e:
+        raise _id_token_http_error(token, e) from e
+    id_token_cache.put(token, claims)
+    return claims
+
+
+async def verify_firebase_id_token_async(token: str, check_revoked: bool = False) -> dict:
+    """
+    Same as verify_firebase_id_token, but cache misses are verified on the
+    TokenVerifierPool instead of the event-loop thread.
+    """
+    check_revoked = check_revoked or CONF.id_token_check_revoked
+    claims = None if check_revoked else id_token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = await TokenVerifierPool.verify(token, check_revoked=check_revoked)
+    except (auth.InvalidIdTokenError, ValueError) as e:
+        raise _id_token_http_error(token, e) from e
+    id_token_cache.put(token, claims)
+    return claims
+
+
+def _id_token_http_error(token: str, e: Exception) -> HTTPException:
+    """401 for a token that failed verification; drops it from the cache"""
+    if isinstance(e, auth.InvalidIdTokenError):
+        id_token_cache.invalidate(token)
+        detail = f"invalid access token={token}"
+    else:
+        detail = "Invalid token format"
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 
 async def reset_password(req: ReqResetPassword) -> dict[str, Any]:
@@ -345,6 +939,8 @@ async def change_password(req: ReqChangePassword) -> dict[str, Any]:
         "returnSecureToken": True,
     }
     response = await make_firebase_api_request(CONF.firebase_update, payload)
+    # Firebase revokes the old tokens on password change
+    id_token_cache.invalidate_uid(req.user_id)
 
     return response
 
@@ -372,18 +968,23 @@ async def change_email(req: ReqChangeEmail) -> dict[str, Any]:
 async def make_firebase_api_request(url, payload):
     try:
         url = url + CONF.firebase_api_key
-        response = requests.post(url, json=payload, timeout=120)
+        response = await FirebaseHttpClient.post(url, payload)
         return response.json()
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         raise HTTPException(
             status_code=e.response.status_code,
             detail=e.response.json().get("error", {}).get("message"),
         ) from e
+    except httpx.TimeoutException as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Firebase request timed out",
+        ) from e
 
 
 async def get_user_email_and_username(user_id: str):
     try:
-        user = auth.get_user(user_id)
+        user = get_backend().admin_auth().get_user(user_id)
         email = user.email
         username = user.display_name
         return email, username
@@ -405,14 +1006,9 @@ async def save_customer_mapping(firebase_uid: str, stripe_customer_id: str):
     db._cache[collection_name][firebase_uid] = {
         "stripe_customer_id": stripe_customer_id
     }
-
-    async def _background_save():
-        doc_ref = (
-            db.get_async_client().collection(collection_name).document(firebase_uid)
-        )
-        await doc_ref.set({"stripe_customer_id": stripe_customer_id})
-
-    get_background_tasks().add_task(_background_save)
+    db.enqueue_set(
+        collection_name, firebase_uid, {"stripe_customer_id": stripe_customer_id}
+    )
     return {"stripe_customer_id": stripe_customer_id}
 
 
@@ -461,17 +1057,23 @@ async def create_user_profile(req: ReqCreateUserProfile):
         },
     }
 
-    # Update cache immediately
-    db._cache[collection_name][req.user_id] = user_data
+    # Update cache immediately; the queued write keeps its own frozen copy
+    cache = db._cache[collection_name]
+    user_data = cache.put(req.user_id, user_data)
+    db.enqueue_set(collection_name, req.user_id, user_data)
+    return _private_copy(cache, user_data)
 
-    async def _background_create():
-        doc_ref = (
-            db.get_async_client().collection(collection_name).document(req.user_id)
-        )
-        await doc_ref.set(user_data)
 
-    get_background_tasks().add_task(_background_create)
-    return user_data
+def _private_copy(cache, document: Any) -> Any:
+    """
+    Returns document in a form the caller may keep or edit without changing
+    the cached version. Frozen documents are shared as-is; mutable ones are
+    deep-copied, so a profile edited in place can't also be the "before"
+    side of the next update's diff.
+    """
+    if cache.policy.read_only:
+        return document
+    return thaw(document)
 
 
 async def update_user_profile(user_id: str, user_data: dict):
@@ -483,15 +1085,20 @@ async def update_user_profile(user_id: str, user_data: dict):
             detail="Invalid user_id: user_id cannot be empty"
         )
     
-    existing_data = db._cache[collection_name].get(user_id, {})
+    # Evicted profiles are re-read so the update never drops fields. The copy
+    # is the unchanged version the merged profile is diffed against.
+    cache = db._cache[collection_name]
+    existing_data = _private_copy(
+        cache, await db.get_document_or_default(collection_name, user_id, {})
+    )
     prdcer_data = user_data.get("prdcer", {})
     existing_prdcer = existing_data.get("prdcer", {})
     
     # Update prdcer_dataset
-    prdcer_dataset = existing_prdcer.get("prdcer_dataset", {}).copy()
-    for key, value in prdcer_data.get("prdcer_dataset", {}).items():
-        if key:  # Simplified null/empty check
-            prdcer_dataset[key] = value
+    prdcer_dataset = {
+        **existing_prdcer.get("prdcer_dataset", {}),
+        **{key: value for key, value in prdcer_data.get("prdcer_dataset", {}).items() if key},
+    }
 
     # Profile-specific update data
     update_data = {
@@ -503,24 +1110,23 @@ async def update_user_profile(user_id: str, user_data: dict):
             "draft_ctlgs": prdcer_data.get("draft_ctlgs", existing_prdcer.get("draft_ctlgs", {})),
         }
     }
-    merged_data = {**existing_data, **update_data}
-    db._cache[collection_name][user_id] = merged_data
-
-
-    async def _background_update():
-        doc_ref = db.get_async_client().collection(collection_name).document(user_id)
-        # Use Firestore's update instead of set to only update specified fields
-        await doc_ref.update(merged_data)
-
-    get_background_tasks().add_task(_background_update)
-    return merged_data
+    merged_data = cache.put(user_id, {**existing_data, **update_data})
+    # Only the changed field paths are written, not the whole prdcer subtree
+    changes = diff_fields(existing_data, merged_data)
+    if changes:
+        db.enqueue_update(collection_name, user_id, changes)
+    return _private_copy(cache, merged_data)
 
 
 async def update_user_profile_settings(settings_data: UserProfileSettings):
     collection_name = "all_user_profiles"
     user_id = settings_data.user_id
 
-    existing_data = db._cache[collection_name].get(user_id, {})
+    # Evicted profiles are re-read so the update never drops fields
+    cache = db._cache[collection_name]
+    existing_data = _private_copy(
+        cache, await db.get_document_or_default(collection_name, user_id, {})
+    )
     
     # Merge existing settings with new settings
     existing_settings = existing_data.get("settings", {})
@@ -538,16 +1144,11 @@ async def update_user_profile_settings(settings_data: UserProfileSettings):
     }
 
     # Preserve existing data while applying updates
-    merged_data = {**existing_data, **update_data}
-    db._cache[collection_name][user_id] = merged_data
-
-    async def _background_update():
-        doc_ref = db.get_async_client().collection(collection_name).document(user_id)
-        # Use Firestore's update instead of set to only update specified fields
-        await doc_ref.update(merged_data)
-
-    get_background_tasks().add_task(_background_update)
-    return merged_data
+    merged_data = cache.put(user_id, {**existing_data, **update_data})
+    changes = diff_fields(existing_data, merged_data)
+    if changes:
+        db.enqueue_update(collection_name, user_id, changes)
+    return _private_copy(cache, merged_data)
 
 
 async def load_user_profile(user_id: str) -> dict:
@@ -556,7 +1157,9 @@ async def load_user_profile(user_id: str) -> dict:
     If the user doesn't exist, creates an empty profile.
     """
     try:
-        return await db.get_document("all_user_profiles", user_id)
+        return _private_copy(
+            db._cache["all_user_profiles"], await db.get_document("all_user_profiles", user_id)
+        )
     except HTTPException as e:
         if e.status_code == status.HTTP_404_NOT_FOUND:
             req = ReqCreateUserProfile(
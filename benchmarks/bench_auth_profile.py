@@ -0,0 +1,152 @@
+"""
+Load test of the auth and profile paths against the in-process fake Firebase
+backend (fake_firebase.py): login, token refresh, ID-token verification,
+profile load and profile update, each driven by many concurrent callers.
+
+    python -m backend_common.benchmarks.bench_auth_profile \
+        [--users 1000] [--requests 5000] [--concurrency 100] [--latency-ms 20]
+
+--latency-ms is injected on every fake Firestore, Identity Toolkit and admin
+auth call (with 20% jitter), so results approximate a real network round trip.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from backend_common.common_config import CONF
+
+CONF.firebase_backend = "fake"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_scenario(name: str, operation, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                await operation(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<15} {requests / elapsed:9.0f} ops/s  "
+        f"p50 {percentile(latencies, 0.50) * 1e3:7.2f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1e3:7.2f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1e3:7.2f} ms  "
+        f"errors {errors}"
+    )
+
+
+async def main(args):
+    latency = args.latency_ms / 1000
+    CONF.fake_firebase_latency = {
+        "firestore_read": latency,
+        "firestore_write": latency,
+        "identity_toolkit": latency,
+        "admin_auth": latency,
+        "jitter": 0.2,
+    }
+    # Imported after the config is set: auth builds its backend and db at import
+    from backend_common.auth import (
+        create_user_profile,
+        db,
+        load_user_profile,
+        login_user,
+        refresh_id_token,
+        update_user_profile,
+        verify_firebase_id_token_async,
+    )
+    from backend_common.dtypes.auth_dtypes import (
+        ReqCreateUserProfile,
+        ReqRefreshToken,
+        ReqUserLogin,
+    )
+    from backend_common.firebase_backend import get_backend
+    from backend_common.http_client import FirebaseHttpClient
+
+    backend = get_backend()
+    await db.initialize_all()
+    users = []
+    for i in range(args.users):
+        email, password = f"user{i}@example.com", f"password-{i}"
+        user = backend.identity_toolkit.add_user(email, password, f"user{i}")
+        await create_user_profile(ReqCreateUserProfile(
+            user_id=user.uid, username=f"user{i}", email=email, password=password
+        ))
+        users.append((user.uid, email, password))
+    await db.flush_writes()
+    tokens = [backend.identity_toolkit.issue_tokens(uid) for uid, _, _ in users]
+    print(
+        f"{args.users} users, {args.requests} requests per scenario, "
+        f"concurrency {args.concurrency}, injected latency {args.latency_ms} ms"
+    )
+
+    async def login(i):
+        _, email, password = users[i % len(users)]
+        await login_user(ReqUserLogin(email=email, password=password))
+
+    async def refresh(i):
+        await refresh_id_token(ReqRefreshToken(
+            grant_type="refresh_token", refresh_token=tokens[i % len(tokens)][1]
+        ))
+
+    async def verify(i):
+        await verify_firebase_id_token_async(tokens[i % len(tokens)][0])
+
+    async def load_profile(i):
+        await load_user_profile(users[i % len(users)][0])
+
+    async def update_profile(i):
+        # Skewed towards a few hot profiles, like bursts of edits
+        uid = users[int(random.paretovariate(1.2)) % len(users)][0]
+        await update_user_profile(uid, {
+            "user_id": uid,
+            "prdcer": {"prdcer_dataset": {"progress": i % 100}},
+        })
+
+    for name, operation in (
+        ("login", login),
+        ("refresh", refresh),
+        ("verify_token", verify),
+        ("load_profile", load_profile),
+        ("update_profile", update_profile),
+    ):
+        await run_scenario(name, operation, args.requests, args.concurrency)
+
+    started = time.perf_counter()
+    await db.drain_writes()
+    write_stats = db.write_stats()
+    print(
+        f"write-behind: {write_stats['enqueued']} enqueued, {write_stats['coalesced']} "
+        f"coalesced, {write_stats['written']} written in {write_stats['batches']} batches "
+        f"(final drain {(time.perf_counter() - started) * 1e3:.1f} ms), "
+        f"{backend.firestore.writes} Firestore document writes"
+    )
+    await FirebaseHttpClient.close()
+    db.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    # auth.py logs every call; keep the report readable
+    logging.disable(logging.INFO)
+    asyncio.run(main(parser.parse_args()))
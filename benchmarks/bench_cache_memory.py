@@ -0,0 +1,85 @@
+"""
+Compares the memory held per cached user profile by each CachePolicy.storage
+mode ("dict", "interned", "packed", "tiered") and the cost of a cached read.
+
+    python -m backend_common.benchmarks.bench_cache_memory [count ...]
+
+Counts default to 100000 and 1000000; the larger run needs several GB in
+"dict" mode.
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from backend_common.firestore_cache import CachePolicy, CollectionCache
+
+STORAGE_MODES = ("dict", "interned", "packed", "tiered")
+
+
+def make_profile(i: int) -> dict:
+    # Decoded per document like Firestore's to_dict(), so key strings are not
+    # shared between profiles
+    profile = json.loads(json.dumps({
+        "user_id": f"uid-{i:08d}",
+        "email": f"user{i}@example.com",
+        "username": f"user{i}",
+        "account_type": "admin" if i % 10 == 0 else "member",
+        "admin_id": None if i % 10 == 0 else f"uid-{i - i % 10:08d}",
+        "settings": {"show_price_on_purchase": i % 2 == 0},
+        "prdcer": {
+            "prdcer_dataset": {
+                "dataset_plan": "plan_basic",
+                "progress": i % 100,
+                "auto_refresh": True,
+            },
+            "prdcer_lyrs": {
+                f"lyr-{i}-{n}": {
+                    "prdcer_layer_name": f"Layer {n}",
+                    "points_color": "#28A745",
+                    "layer_legend": "",
+                    "layer_description": "",
+                    "city_name": "Riyadh",
+                    "bknd_dataset_id": f"ds-{n}",
+                }
+                for n in range(3)
+            },
+            "prdcer_ctlgs": {},
+            "draft_ctlgs": {},
+        },
+    }))
+    profile["prdcer"]["prdcer_dataset"]["dataset_next_refresh_date"] = datetime(2025, 1, 1)
+    return profile
+
+
+def measure(storage: str, count: int) -> tuple[float, float]:
+    """Returns (bytes per profile, microseconds per read)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = CollectionCache(CachePolicy(storage=storage))
+    for i in range(count):
+        cache[f"uid-{i:08d}"] = make_profile(i)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    reads = min(count, 100_000)
+    start = time.perf_counter()
+    for i in range(reads):
+        cache[f"uid-{i:08d}"]
+    read_us = (time.perf_counter() - start) / reads * 1e6
+    return held / count, read_us
+
+
+def main(counts: list[int]):
+    for count in counts:
+        for storage in STORAGE_MODES:
+            per_profile, read_us = measure(storage, count)
+            print(
+                f"{count:>9,} profiles  {storage:<8}  "
+                f"{per_profile:8,.0f} bytes/profile  {read_us:6.2f} us/read"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
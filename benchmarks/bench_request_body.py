@@ -0,0 +1,61 @@
+"""
+Compares user_id extraction on multi-MB JSON bodies: a full json.loads of the
+body versus the key scan used by request_body.extract_user_id.
+
+    python -m backend_common.benchmarks.bench_request_body
+"""
+import asyncio
+import json
+import time
+
+from starlette.requests import Request
+
+from backend_common.common_config import CONF
+from backend_common.request_body import extract_user_id
+
+
+def make_body(n_features: int) -> bytes:
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"name": f"place {i}", "address": f"{i} King Fahd Rd", "rating": i % 5},
+            "geometry": {"type": "Point", "coordinates": [46.6 + i * 1e-6, 24.7]},
+        }
+        for i in range(n_features)
+    ]
+    return json.dumps({"features": features, "user_id": "user-123"}).encode()
+
+
+def make_request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+
+async def time_extraction(body: bytes, threshold: int, rounds: int) -> float:
+    CONF.request_body_scan_threshold = threshold
+    start = time.perf_counter()
+    for _ in range(rounds):
+        assert await extract_user_id(make_request(body)) == "user-123"
+    return (time.perf_counter() - start) / rounds
+
+
+async def main():
+    for n_features in (10_000, 50_000):
+        body = make_body(n_features)
+        full = await time_extraction(body, threshold=len(body) + 1, rounds=5)
+        scan = await time_extraction(body, threshold=0, rounds=5)
+        print(
+            f"{len(body) / 1e6:6.1f} MB  json.loads {full * 1e3:8.2f} ms  "
+            f"scan {scan * 1e3:8.2f} ms  ({full / scan:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
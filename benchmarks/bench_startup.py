@@ -0,0 +1,42 @@
+"""
+Measures how long a fresh interpreter takes to import backend modules, to
+catch work (sleeps, network calls, client construction) creeping back into
+import time.
+
+    python -m backend_common.benchmarks.bench_startup [--runs 5] [module ...]
+
+Modules default to backend_common.database and
+backend_common.stripe_backend.customers.
+Each run is a new subprocess, so nothing is served from sys.modules.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ("backend_common.database", "backend_common.stripe_backend.customers")
+
+
+def time_import(module: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    return time.perf_counter() - started
+
+
+def main(args):
+    baseline = [time_import("sys") for _ in range(args.runs)]
+    print(f"{'interpreter':<45} median {statistics.median(baseline) * 1e3:8.1f} ms")
+    for module in args.modules:
+        samples = [time_import(module) for _ in range(args.runs)]
+        print(
+            f"{module:<45} median {statistics.median(samples) * 1e3:8.1f} ms  "
+            f"max {max(samples) * 1e3:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    main(parser.parse_args())
@@ -9,12 +9,42 @@ class CommonApiConfig:
     backend_base_uri: str = "/fastapi/"
     firebase_api_key: str = ""
     firebase_sp_path: str = ""
+    # "google", or "fake" for the in-process stand-in in fake_firebase.py
+    firebase_backend: str = "google"
+    # fake_firebase.LatencyProfile fields, in seconds
+    fake_firebase_latency: dict[str, float] = field(default_factory=dict)
     firestore_collections: list[str] = field(default_factory=lambda: [
         "all_user_profiles",
         "firebase_stripe_mappings",
         "layer_matchings",
         "ccc"
     ])
+    # Per-collection FirestoreDB cache policy, see firestore_cache.CachePolicy.
+    # Collections without an entry are unbounded listener mirrors.
+    firestore_cache_policies: dict[str, dict] = field(default_factory=dict)
+    # In-memory secondary indexes per cached collection (dotted field paths)
+    firestore_indexes: dict[str, list[str]] = field(default_factory=lambda: {
+        "all_user_profiles": ["admin_id", "email", "account_type"],
+    })
+    firestore_warmup_page_size: int = 1000
+    # "batched": apply each listener snapshot as one locked batch with one
+    # summary log line; "per_document": apply and log every change
+    firestore_listener_mode: str = "batched"
+    # FirestoreDB.get_documents batching
+    firestore_get_all_batch_size: int = 100
+    firestore_get_all_concurrency: int = 4
+    # Local on-disk cache snapshots for fast cold start ("" disables)
+    firestore_snapshot_dir: str = ""
+    firestore_snapshot_interval: float = 300.0
+    # SQLite file shared by all workers on a host ("" keeps a cache per
+    # process). One worker runs the listeners, the others read the store.
+    firestore_shared_cache_path: str = ""
+    firestore_shared_cache_poll_interval: float = 1.0
+    # Write-behind queue for profile writes: flush when this many documents
+    # are pending (capped at Firestore's 500-operation batch limit) or after
+    # the interval
+    firestore_write_batch_size: int = 500
+    firestore_write_flush_interval: float = 0.5
     stripe_api_key: str = ""
     firebase_base_url: str = "https://identitytoolkit.googleapis.com/v1/accounts:"
     firebase_refresh_token = f"{firebase_base_url[:-9]}token?key="  ## Change
@@ -23,6 +53,32 @@ class CommonApiConfig:
     firebase_resetPassword = f"{firebase_base_url}resetPassword?key="
     firebase_signInWithCustomToken = f"{firebase_base_url}signInWithCustomToken?key="
     firebase_update = f"{firebase_base_url}update?key="
+    # Shared HTTP client for the firebase_* endpoints
+    firebase_http_timeout: float = 30.0
+    firebase_http_endpoint_timeouts: dict[str, float] = field(default_factory=lambda: {
+        "signInWithPassword": 10.0,
+        "token": 10.0,
+        "sendOobCode": 20.0,
+        "resetPassword": 15.0,
+        "signInWithCustomToken": 10.0,
+        "update": 15.0,
+    })
+    firebase_http_max_connections: int = 100
+    firebase_http_max_keepalive: int = 20
+    firebase_http_keepalive_expiry: float = 60.0
+    # Verified ID-token cache
+    id_token_cache_max_entries: int = 10000
+    id_token_check_revoked: bool = False
+    # ID-token verification: "inline", "thread" or "process"
+    id_token_verify_mode: str = "thread"
+    id_token_verify_workers: int = 4
+    id_token_certs_refresh_margin: float = 300.0
+    # JSON bodies above this size are scanned for user_id instead of decoded
+    request_body_scan_threshold: int = 64 * 1024
+    # Path serving Prometheus-format metrics ("" disables the endpoint)
+    metrics_endpoint: str = "/metrics"
+    # Path answering 200 once the Postgres pool is up, 503 before ("" disables it)
+    readiness_endpoint: str = "/ready"
     enable_CORS_url: str = "http://localhost:3000"
     reset_password: str = backend_base_uri + "reset-password"
     confirm_reset: str = backend_base_uri + "confirm-reset"
@@ -97,6 +153,7 @@ class CommonApiConfig:
                     data = json.load(config_file)
                     conf.stripe_api_key = data.get("stripe_api_key", "")
 
+            conf.firebase_backend = os.getenv("FIREBASE_BACKEND", conf.firebase_backend)
             return conf
         except Exception as e:
             return conf
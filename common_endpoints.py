@@ -1,5 +1,5 @@
 from fastapi import Body, HTTPException, status, FastAPI, Request, Depends
-from backend_common.auth import JWTBearer
+from backend_common.auth import JWTBearer, db
 from backend_common.dtypes.auth_dtypes import (
     ReqCreateFirebaseUser,
     ReqChangeEmail,
@@ -25,8 +25,46 @@ from backend_common.auth import (
     change_email,
 )
 from backend_common.stripe_backend.customers import create_stripe_customer
-
-app = FastAPI()
+from backend_common.database import Database
+from backend_common.http_client import FirebaseHttpClient
+from backend_common.token_verifier import TokenVerifierPool
+from backend_common.common_config import CONF
+from backend_common.metrics import REGISTRY
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _log_db_startup_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Database startup gave up: {task.exception()}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await FirebaseHttpClient.open()
+    await TokenVerifierPool.start()
+    # Connect to Postgres in the background so the app serves (and reports
+    # not-ready) while the database is still coming up
+    db_startup = asyncio.create_task(Database.startup()) if Database.dsn else None
+    if db_startup is not None:
+        db_startup.add_done_callback(_log_db_startup_failure)
+    try:
+        yield
+    finally:
+        if db_startup is not None and not db_startup.done():
+            db_startup.cancel()
+        await Database.close_pool()
+        if db is not None:
+            await db.drain_writes()
+        await TokenVerifierPool.stop()
+        await FirebaseHttpClient.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/index", dependencies=[Depends(JWTBearer())])
@@ -35,6 +73,24 @@ def index():
     return {"message": "Hello World"}
 
 
+if CONF.metrics_endpoint:
+
+    @app.get(CONF.metrics_endpoint, response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return REGISTRY.render()
+
+
+if CONF.readiness_endpoint:
+
+    @app.get(CONF.readiness_endpoint, include_in_schema=False)
+    def readiness():
+        if Database.dsn and not Database.is_ready():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database not ready"
+            )
+        return {"status": "ready"}
+
+
 # @app.post("/create_firebase_stripe_user", response_model=list[Dict[Any, Any]])
 # async def create_user_profile_endpoint(req: ReqCreateFirebaseUser):
 
@@ -1,5 +1,65 @@
 from dataclasses import dataclass
 
+# Named, parameterized statements. Every pooled connection prepares them when
+# it is opened, so Database.fetch_named / fetchrow_named / execute_named skip
+# the parse and plan steps on each call.
+STATEMENTS: dict[str, str] = {
+    # Stripe products
+    "insert_stripe_product": "INSERT INTO Stripe_Products (product_id) VALUES ($1) RETURNING *",
+    "select_stripe_product": "SELECT * FROM Stripe_Products WHERE product_id = $1",
+    "delete_stripe_product": "DELETE FROM Stripe_Products WHERE product_id = $1",
+    # Prices
+    "insert_price": "INSERT INTO prices (price_id, product_id) VALUES ($1, $2) RETURNING *",
+    "list_prices": "SELECT * FROM prices",
+    "update_price": """
+        UPDATE prices
+        SET
+            currency = $1,
+            unit_amount = $2,
+            base_amount = $3,
+            included_seats = $4,
+            additional_seat_price = $5,
+            recurring_interval = $6,
+            recurring_interval_count = $7,
+            updated_at = $8
+        WHERE price_id = $9
+        RETURNING *
+    """,
+    "update_price_seats": """
+        UPDATE prices
+        SET
+            included_seats = $1,
+            updated_at = $2
+        WHERE price_id = $3
+        RETURNING *
+    """,
+    "delete_price": "DELETE FROM prices WHERE price_id = $1",
+    # Subscriptions and payment methods
+    "insert_stripe_subscription": (
+        "INSERT INTO stripe_subscriptions (subscription_id, user_id, product_id) VALUES ($1, $2, $3)"
+    ),
+    "insert_stripe_payment_method": """
+        INSERT INTO stripe_payment_methods (payment_method_id, user_id, customer_id, type, billing_details)
+        VALUES ($1, $2, $3, $4, $5) RETURNING *
+    """,
+    # Teams
+    "insert_team": "INSERT INTO teams (team_name, owner_id) VALUES ($1, $2) RETURNING *",
+    "insert_team_member": "INSERT INTO team_members (team_id, user_id) VALUES ($1, $2) RETURNING *",
+    "delete_team_member": "DELETE FROM team_members WHERE team_id = $1 AND user_id = $2",
+    "delete_team": "DELETE FROM teams WHERE team_id = $1",
+    "list_teams": "SELECT * FROM teams",
+}
+
+
+def register_statement(name: str, sql: str):
+    """
+    Adds a named statement to STATEMENTS. Connections already in the pool
+    prepare it on first use; new connections prepare it when opened.
+    """
+    if STATEMENTS.get(name, sql) != sql:
+        raise ValueError(f"Statement {name!r} is already registered with different SQL")
+    STATEMENTS[name] = sql
+
 
 @dataclass
 class CommonSql:
@@ -1,25 +1,129 @@
 # database.py
+import asyncio
+import contextvars
 import datetime
+import random
+import re
 import uuid
 import os
 import asyncpg
 from asyncpg.pool import Pool
 from typing import Optional, List
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
 import time
+from backend_common.common_sql import STATEMENTS
 from backend_common.logging_wrapper import apply_decorator_to_module
+from backend_common.metrics import REGISTRY
 
 from backend_common.logger import logging
 
 logger = logging.getLogger(__name__)
 
 
+class _PooledConnection(asyncpg.Connection):
+    """asyncpg connection carrying the common_sql statements prepared on it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.named_statements = {}
+
+
+# Replication delay in seconds; 0 on a primary or a standby that has replayed
+# everything it received (an idle primary must not read as lag). NULL when the
+# standby's WAL receiver is not streaming: it has replayed all it received but
+# receives nothing new. status is only visible with pg_read_all_stats, so a
+# running receiver of unknown status counts as streaming.
+_REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Errors after which a read is retried on the primary and the replica is
+# taken out of rotation until the next health check
+_REPLICA_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
+# SELECTs that lock rows or call functions that write; these can't run on a
+# standby. Functions not listed here (e.g. app procedures) fail there with
+# ReadOnlySQLTransactionError and are retried on the primary.
+_WRITING_SELECT = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b"
+    r"|\b(NEXTVAL|SETVAL|PG_ADVISORY_(XACT_)?LOCK\w*|PG_TRY_ADVISORY_(XACT_)?LOCK\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+# True inside Database.use_primary() and Database.transaction()
+_force_primary: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "database_force_primary", default=False
+)
+
+
+class _Replica:
+    """A read replica's pool and its last health check"""
+
+    def __init__(self, name: str, dsn: str):
+        self.name = name
+        self.dsn = dsn
+        self.pool: Optional[Pool] = None
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.reads = 0
+        self.errors = 0
+        self.busy = 0
+        self.last_error: Optional[str] = None
+
+
 class Database:
     pool: Optional[Pool] = None
     last_refresh_time: float = 0
-    refresh_interval: int = 3600  # Refresh every hour
-    time.sleep(5)
+    refresh_interval: int = 3600  # Recycle connections every hour
+    refresh_acquire_timeout: float = 1.0  # Max seconds waiting for each one
+    # Per-connection recycling done by asyncpg itself
+    max_queries: int = int(os.getenv("DATABASE_POOL_MAX_QUERIES", "50000"))
+    max_inactive_connection_lifetime: float = float(
+        os.getenv("DATABASE_POOL_MAX_INACTIVE_SECONDS", "300")
+    )
     dsn: str = os.getenv("DATABASE_URL")
+    # startup() retry policy: attempts, first delay and cap in seconds
+    startup_attempts: int = int(os.getenv("DATABASE_STARTUP_ATTEMPTS", "10"))
+    startup_backoff: float = 0.5
+    startup_max_backoff: float = 10.0
+    ready: bool = False
+    _startup_lock: Optional[asyncio.Lock] = None
+    _refresh_lock: Optional[asyncio.Lock] = None
+    _maintenance_task: Optional[asyncio.Task] = None
+    # Query logging: every query slower than slow_query_threshold seconds is
+    # logged at WARNING; of the rest, query_log_sample_rate are logged at DEBUG
+    slow_query_threshold: float = float(os.getenv("DATABASE_SLOW_QUERY_SECONDS", "0.5"))
+    query_log_sample_rate: float = float(os.getenv("DATABASE_QUERY_LOG_SAMPLE_RATE", "1.0"))
+    # Read replicas (comma-separated DSNs); reads go to healthy ones round-robin
+    replica_dsns: List[str] = [
+        dsn.strip() for dsn in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if dsn.strip()
+    ]
+    replica_max_lag: float = float(os.getenv("DATABASE_REPLICA_MAX_LAG_SECONDS", "10"))
+    replica_check_interval: float = 5.0
+    replica_check_timeout: float = 5.0
+    # Max seconds a read waits for a replica connection before using the primary
+    replica_acquire_timeout: float = 0.1
+    replicas: List[_Replica] = []
+    primary_reads: int = 0
+    _replica_cursor: int = 0
+    _replica_task: Optional[asyncio.Task] = None
+    # Named statement lookups served by an already-prepared statement / prepared on demand
+    statement_hits: int = 0
+    statement_misses: int = 0
 
     @classmethod
     async def create_pool(cls):
@@ -27,10 +131,146 @@ class Database:
         Creates a new connection pool with specified configuration.
         
         Sets up an asyncpg connection pool with min_size=1 and max_size=10.
-        Updates the last refresh time after creation.
+        Connections are replaced after max_queries queries or when idle for
+        max_inactive_connection_lifetime seconds. Updates the last refresh
+        time and starts the background refresh task.
+        
+        Also opens a pool per replica in replica_dsns and starts their health
+        checks; a replica that is down only stays out of rotation.
         """
-        cls.pool = await asyncpg.create_pool(dsn=cls.dsn, min_size=1, max_size=10)
+        cls.pool = await cls._open_pool(cls.dsn)
         cls.last_refresh_time = time.time()
+        cls.ready = True
+        if cls._maintenance_task is None or cls._maintenance_task.done():
+            cls._maintenance_task = asyncio.create_task(cls._maintenance_loop())
+        if cls.replica_dsns:
+            if not cls.replicas:
+                cls.replicas = [
+                    _Replica(cls._replica_name(dsn, i), dsn)
+                    for i, dsn in enumerate(cls.replica_dsns)
+                ]
+            await asyncio.gather(*(cls._check_replica(replica) for replica in cls.replicas))
+            if cls._replica_task is None or cls._replica_task.done():
+                cls._replica_task = asyncio.create_task(cls._replica_monitor_loop())
+
+    @classmethod
+    async def _open_pool(cls, dsn: str, **kwargs) -> Pool:
+        return await asyncpg.create_pool(
+            dsn=dsn,
+            min_size=1,
+            max_size=10,
+            max_queries=cls.max_queries,
+            max_inactive_connection_lifetime=cls.max_inactive_connection_lifetime,
+            connection_class=_PooledConnection,
+            init=cls._prepare_statements,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _replica_name(dsn: str, index: int) -> str:
+        """host:port for logs and metric labels, keeping credentials out"""
+        try:
+            parts = urlsplit(dsn)
+            return f"{parts.hostname}:{parts.port or 5432}" if parts.hostname else f"replica-{index}"
+        except ValueError:
+            return f"replica-{index}"
+
+    @classmethod
+    async def _check_replica(cls, replica: _Replica):
+        """
+        Opens the replica's pool if needed and measures its replication lag.
+        
+        The replica serves reads only while it answers and lags by at most
+        replica_max_lag seconds.
+        """
+        was_healthy = replica.healthy
+        try:
+            if replica.pool is None:
+                replica.pool = await cls._open_pool(
+                    replica.dsn, timeout=cls.replica_check_timeout
+                )
+            async with replica.pool.acquire(timeout=cls.replica_check_timeout) as conn:
+                lag = await conn.fetchval(_REPLICA_LAG_QUERY, timeout=cls.replica_check_timeout)
+            if lag is None:
+                raise ConnectionError("standby is not streaming WAL from the primary")
+            replica.lag_seconds = float(lag)
+            replica.healthy = replica.lag_seconds <= cls.replica_max_lag
+            if not replica.healthy and was_healthy:
+                logger.warning(
+                    f"Replica {replica.name} lags {replica.lag_seconds:.1f}s; "
+                    "routing its reads to other pools"
+                )
+            replica.last_error = None
+        except Exception as e:
+            replica.healthy = False
+            replica.lag_seconds = None
+            # Once per distinct failure, not on every check
+            if was_healthy or str(e) != replica.last_error:
+                logger.warning(f"Replica {replica.name} health check failed: {e}")
+            replica.last_error = str(e)
+        if replica.healthy and not was_healthy:
+            logger.info(f"Replica {replica.name} is in rotation")
+
+    @classmethod
+    async def _replica_monitor_loop(cls):
+        while True:
+            await asyncio.sleep(cls.replica_check_interval)
+            await asyncio.gather(*(cls._check_replica(replica) for replica in cls.replicas))
+
+    @classmethod
+    async def _prepare_statements(cls, conn: _PooledConnection):
+        """
+        Prepares every common_sql statement on a newly opened pool connection.
+        
+        A statement that fails to prepare (e.g. its table does not exist yet)
+        is logged and prepared again on first use instead of failing the pool.
+        """
+        for name, sql in STATEMENTS.items():
+            try:
+                conn.named_statements[name] = await conn.prepare(sql)
+            except asyncpg.PostgresError as e:
+                logger.warning(f"Could not prepare statement {name}: {e}")
+
+    @classmethod
+    async def startup(cls):
+        """
+        Creates the connection pool, retrying with exponential backoff until
+        Postgres accepts connections.
+        
+        Makes up to startup_attempts attempts, waiting startup_backoff seconds
+        after the first failure and doubling up to startup_max_backoff.
+        Concurrent callers share one startup. Sets Database.ready on success.
+        
+        Raises:
+            The last connection error once every attempt has failed
+        """
+        async with cls._get_startup_lock():
+            if cls.pool is not None:
+                return
+            delay = cls.startup_backoff
+            for attempt in range(1, cls.startup_attempts + 1):
+                try:
+                    await cls.create_pool()
+                    logger.info(f"Database pool ready after {attempt} attempt(s)")
+                    return
+                except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                    # CannotConnectNowError (server starting up) is a PostgresError
+                    if attempt == cls.startup_attempts:
+                        logger.error(f"Database startup failed after {attempt} attempts: {e}")
+                        raise
+                    logger.warning(
+                        f"Database not reachable (attempt {attempt}/{cls.startup_attempts}): "
+                        f"{e}; retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, cls.startup_max_backoff)
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        """
+        Returns True once a connection pool has been created.
+        """
+        return cls.ready and cls.pool is not None
 
     @classmethod
     async def close_pool(cls):
@@ -38,37 +278,93 @@ class Database:
         Closes the existing connection pool if it exists.
         Sets the pool reference to None after closing.
         """
+        if cls._maintenance_task is not None:
+            cls._maintenance_task.cancel()
+            cls._maintenance_task = None
+        if cls._replica_task is not None:
+            cls._replica_task.cancel()
+            cls._replica_task = None
+        for replica in cls.replicas:
+            if replica.pool is not None:
+                await replica.pool.close()
+        cls.replicas = []
         if cls.pool:
             await cls.pool.close()
         cls.pool = None
+        cls.ready = False
 
     @classmethod
     async def get_pool(cls):
         """
         Retrieves the current connection pool or creates a new one.
         
-        If the pool doesn't exist, creates a new one.
-        If the pool exists but is older than refresh_interval, refreshes it.
+        If the pool doesn't exist, creates a new one; concurrent callers
+        share that creation. Refreshing happens in the background.
         
         Returns:
             Pool: The current database connection pool
         """
-        if not cls.pool:
-            await cls.create_pool()
-        elif time.time() - cls.last_refresh_time > cls.refresh_interval:
-            await cls.refresh_pool()
+        if cls.pool is None:
+            async with cls._get_startup_lock():
+                if cls.pool is None:
+                    await cls.create_pool()
         return cls.pool
 
     @classmethod
     async def refresh_pool(cls):
         """
-        Refreshes the connection pool by creating a new one and closing the old one.
-        Prints a message indicating the refresh operation.
+        Recycles every connection in the pool without replacing the pool.
+        
+        As many connections as were idle are reopened here, so requests don't
+        pay for reconnecting; checked-out connections are closed when released.
+        A call made while a refresh is already running returns immediately.
         """
-        print("Refreshing connection pool...")
-        old_pool = cls.pool
-        await cls.create_pool()
-        await old_pool.close()
+        pool = cls.pool
+        if pool is None:
+            return
+        if cls._refresh_lock is None:
+            cls._refresh_lock = asyncio.Lock()
+        if cls._refresh_lock.locked():
+            return
+        async with cls._refresh_lock:
+            logger.info("Recycling database pool connections")
+            count = max(pool.get_idle_size(), pool.get_min_size())
+            await pool.expire_connections()
+
+            # Acquiring an expired idle connection reconnects it. The acquires
+            # start together, so each takes a different idle connection, and
+            # each is released as soon as it has reconnected. One that requests
+            # keep busy past the timeout reconnects on its next use instead.
+            async def reopen() -> bool:
+                try:
+                    async with pool.acquire(timeout=cls.refresh_acquire_timeout):
+                        return True
+                except asyncio.TimeoutError:
+                    return False
+
+            reopened = sum(await asyncio.gather(*(reopen() for _ in range(count))))
+            if reopened < count:
+                logger.info(f"Reopened {reopened} of {count} pool connections")
+            cls.last_refresh_time = time.time()
+
+    @classmethod
+    async def _maintenance_loop(cls):
+        while True:
+            await asyncio.sleep(
+                max(cls.last_refresh_time + cls.refresh_interval - time.time(), 0)
+            )
+            try:
+                await cls.refresh_pool()
+            except Exception as e:
+                logger.warning(f"Database pool refresh failed: {e}")
+                # Don't retry in a tight loop
+                cls.last_refresh_time = time.time()
+
+    @classmethod
+    def _get_startup_lock(cls) -> asyncio.Lock:
+        if cls._startup_lock is None:
+            cls._startup_lock = asyncio.Lock()
+        return cls._startup_lock
 
     @classmethod
     @asynccontextmanager
@@ -84,36 +380,113 @@ class Database:
             yield conn
 
     @classmethod
-    async def fetch(cls, query: str, *args):
+    @contextmanager
+    def use_primary(cls):
+        """
+        Context manager sending every read made inside it to the primary,
+        e.g. to read back a row just written.
+        """
+        token = _force_primary.set(True)
+        try:
+            yield
+        finally:
+            _force_primary.reset(token)
+
+    @classmethod
+    def _pick_replica(cls) -> Optional[_Replica]:
+        """Next healthy replica round-robin, or None to read from the primary"""
+        replicas = cls.replicas
+        for _ in range(len(replicas)):
+            cls._replica_cursor = (cls._replica_cursor + 1) % len(replicas)
+            replica = replicas[cls._replica_cursor]
+            if replica.healthy and replica.pool is not None:
+                return replica
+        return None
+
+    @staticmethod
+    def _is_read_only(query: str) -> bool:
+        # Anything but a plain SELECT (INSERT ... RETURNING, WITH ... that may
+        # write, SELECT ... FOR UPDATE, SELECT nextval(...)) stays on the primary
+        return query.lstrip()[:6].upper() == "SELECT" and not _WRITING_SELECT.search(query)
+
+    @classmethod
+    async def _read(cls, query: str, run, primary: bool = False):
+        """
+        Runs a callback for query on a connection from a healthy replica.
+        
+        Uses the primary instead when query is not a plain SELECT, when
+        primary is set, inside use_primary() or a transaction, or when no
+        replica is available. A replica that fails with a connection error is
+        taken out of rotation and the query is retried on the primary; a
+        query that turns out to write is retried there too, as is one that
+        finds no free replica connection within replica_acquire_timeout.
+        """
+        replica = None
+        if cls.replicas and not primary and not _force_primary.get() and cls._is_read_only(query):
+            replica = cls._pick_replica()
+        if replica is not None:
+            acquired = False
+            try:
+                async with replica.pool.acquire(timeout=cls.replica_acquire_timeout) as conn:
+                    acquired = True
+                    replica.reads += 1
+                    return await run(conn)
+            except asyncpg.ReadOnlySQLTransactionError as e:
+                # The query writes (e.g. calls a procedure); the replica is fine
+                logger.info(f"Read on replica {replica.name} needs the primary: {e}")
+            except _REPLICA_ERRORS as e:
+                if not acquired and isinstance(e, asyncio.TimeoutError):
+                    # Saturated, not failing; the health check catches a dead one
+                    replica.busy += 1
+                else:
+                    replica.healthy = False
+                    replica.errors += 1
+                    logger.warning(f"Read on replica {replica.name} failed, using primary: {e}")
+        async with cls.connection() as conn:
+            cls.primary_reads += 1
+            return await run(conn)
+
+    @classmethod
+    async def fetch(cls, query: str, *args, primary: bool = False):
         """
         Executes a query and returns all results.
         
+        SELECT queries run on a read replica when one is healthy.
+        
         Args:
             query: SQL query string
             *args: Query parameters
+            primary: If True, always runs on the primary
         
         Returns:
             List[Record]: List of all matching records
         """
-        logger.info(f"Executing fetch query: {cls.generate_sql_script(query, *args)}")
-        async with cls.connection() as conn:
-            return await conn.fetch(query, *args)
+        started = time.perf_counter()
+        try:
+            return await cls._read(query, lambda conn: conn.fetch(query, *args), primary)
+        finally:
+            cls._log_query("fetch", query, args, time.perf_counter() - started)
 
     @classmethod
-    async def fetchrow(cls, query: str, *args):
+    async def fetchrow(cls, query: str, *args, primary: bool = False):
         """
         Executes a query and returns the first result.
         
+        SELECT queries run on a read replica when one is healthy.
+        
         Args:
             query: SQL query string
             *args: Query parameters
+            primary: If True, always runs on the primary
         
         Returns:
             Record: First matching record or None
         """
-        logger.info(f"Executing fetchrow query: {cls.generate_sql_script(query, *args)}")
-        async with cls.connection() as conn:
-            return await conn.fetchrow(query, *args)
+        started = time.perf_counter()
+        try:
+            return await cls._read(query, lambda conn: conn.fetchrow(query, *args), primary)
+        finally:
+            cls._log_query("fetchrow", query, args, time.perf_counter() - started)
 
     @classmethod
     async def execute(cls, query: str, *args, save_sql_script: bool = False):
@@ -128,16 +501,18 @@ class Database:
         Returns:
             str: Command completion tag
         """
-        formatted_query = cls.generate_sql_script(query, *args)
-        logger.info(f"Executing query: {formatted_query}")
-        async with cls.connection() as conn:
-            if save_sql_script:
-                unique_id = str(uuid.uuid4())[:8]
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                sql_script = cls.generate_sql_script(query, *args)
-                filename = f"sql_script_{timestamp}_{unique_id}.sql"
-                cls.save_sql_script(filename, sql_script)
-            return await conn.execute(query, *args)
+        if save_sql_script:
+            unique_id = str(uuid.uuid4())[:8]
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            sql_script = cls.generate_sql_script(query, *args)
+            filename = f"sql_script_{timestamp}_{unique_id}.sql"
+            cls.save_sql_script(filename, sql_script)
+        started = time.perf_counter()
+        try:
+            async with cls.connection() as conn:
+                return await conn.execute(query, *args)
+        finally:
+            cls._log_query("execute", query, args, time.perf_counter() - started)
 
     @classmethod
     async def execute_many(cls, query: str, entries: List[list]):
@@ -151,10 +526,167 @@ class Database:
         Returns:
             List[str]: List of command completion tags
         """
-        logger.info(f"Executing many queries with template: {query}")
-        logger.debug(f"First few entries: {entries[:3]}")  # Log just first few entries to avoid overwhelming logs
-        async with cls.connection() as conn:
-            return await conn.executemany(query, entries)
+        started = time.perf_counter()
+        try:
+            async with cls.connection() as conn:
+                return await conn.executemany(query, entries)
+        finally:
+            # Log just the first few entries to avoid overwhelming logs
+            cls._log_query("execute_many", query, entries[:3], time.perf_counter() - started)
+
+    @classmethod
+    async def fetch_named(cls, name: str, *args, primary: bool = False):
+        """
+        Runs a common_sql statement by name and returns all results.
+        
+        SELECT statements run on a read replica when one is healthy.
+        
+        Args:
+            name: Key in common_sql.STATEMENTS
+            *args: Query parameters
+            primary: If True, always runs on the primary
+        
+        Returns:
+            List[Record]: List of all matching records
+        """
+        return await cls._run_named(
+            "fetch", name, args, lambda statement: statement.fetch(*args), read=True, primary=primary
+        )
+
+    @classmethod
+    async def fetchrow_named(cls, name: str, *args, primary: bool = False):
+        """
+        Runs a common_sql statement by name and returns the first result.
+        
+        SELECT statements run on a read replica when one is healthy.
+        
+        Args:
+            name: Key in common_sql.STATEMENTS
+            *args: Query parameters
+            primary: If True, always runs on the primary
+        
+        Returns:
+            Record: First matching record or None
+        """
+        return await cls._run_named(
+            "fetchrow", name, args, lambda statement: statement.fetchrow(*args), read=True, primary=primary
+        )
+
+    @classmethod
+    async def execute_named(cls, name: str, *args):
+        """
+        Runs a common_sql statement by name.
+        
+        Args:
+            name: Key in common_sql.STATEMENTS
+            *args: Query parameters
+        
+        Returns:
+            str: Command completion tag
+        """
+
+        async def run(statement):
+            await statement.fetch(*args)
+            return statement.get_statusmsg()
+
+        return await cls._run_named("execute", name, args, run)
+
+    @classmethod
+    async def _run_named(
+        cls, kind: str, name: str, args, run, read: bool = False, primary: bool = False
+    ):
+        if name not in STATEMENTS:
+            raise KeyError(f"Unknown statement {name!r}; add it to common_sql.STATEMENTS")
+
+        async def run_on(conn):
+            try:
+                return await run(await cls._get_statement(conn, name))
+            except asyncpg.InvalidCachedStatementError:
+                # The schema changed under the prepared statement
+                conn.named_statements.pop(name, None)
+                return await run(await cls._get_statement(conn, name))
+
+        started = time.perf_counter()
+        try:
+            if read:
+                return await cls._read(STATEMENTS[name], run_on, primary)
+            async with cls.connection() as conn:
+                return await run_on(conn)
+        finally:
+            cls._log_query(kind, STATEMENTS[name], args, time.perf_counter() - started)
+
+    @classmethod
+    async def _get_statement(cls, conn: _PooledConnection, name: str):
+        statement = conn.named_statements.get(name)
+        if statement is not None:
+            cls.statement_hits += 1
+            return statement
+        cls.statement_misses += 1
+        statement = conn.named_statements[name] = await conn.prepare(STATEMENTS[name])
+        return statement
+
+    @classmethod
+    def _collect_metrics(cls):
+        """Prepared-statement and per-pool counters for the metrics registry"""
+        help = "Named statement lookups by whether the statement was already prepared"
+        yield "database_prepared_statements_total", "counter", help, {"result": "hit"}, cls.statement_hits
+        yield "database_prepared_statements_total", "counter", help, {"result": "miss"}, cls.statement_misses
+        pools = [("primary", "primary", cls.pool, cls.primary_reads)]
+        pools += [(r.name, "replica", r.pool, r.reads) for r in cls.replicas]
+        for name, role, pool, reads in pools:
+            labels = {"pool": name, "role": role}
+            yield (
+                "database_pool_reads_total", "counter",
+                "fetch/fetchrow calls routed to the pool", labels, reads,
+            )
+            if pool is not None:
+                yield "database_pool_connections", "gauge", "Open connections", labels, pool.get_size()
+                yield "database_pool_idle_connections", "gauge", "Idle connections", labels, pool.get_idle_size()
+        for replica in cls.replicas:
+            labels = {"pool": replica.name}
+            yield (
+                "database_replica_healthy", "gauge",
+                "1 while the replica is in read rotation", labels, int(replica.healthy),
+            )
+            yield (
+                "database_replica_errors_total", "counter",
+                "Reads that failed on the replica and were retried on the primary",
+                labels, replica.errors,
+            )
+            yield (
+                "database_replica_busy_total", "counter",
+                "Reads sent to the primary because no replica connection was free",
+                labels, replica.busy,
+            )
+            if replica.lag_seconds is not None:
+                yield (
+                    "database_replica_lag_seconds", "gauge",
+                    "Replication lag at the last health check", labels, replica.lag_seconds,
+                )
+
+    @classmethod
+    def _log_query(cls, kind: str, query: str, args, elapsed: float):
+        """
+        Logs a completed query with its parameters kept separate from the SQL.
+        
+        Slow queries are always logged at WARNING. Other queries are logged at
+        DEBUG for a query_log_sample_rate fraction of calls, and only when DEBUG
+        is enabled; nothing is formatted otherwise.
+        
+        Args:
+            kind: Database method that ran the query
+            query: Parameterized SQL query string
+            args: Query parameters
+            elapsed: Seconds taken, including waiting for a pooled connection
+        """
+        if elapsed >= cls.slow_query_threshold:
+            logger.warning(
+                "Slow %s query (%.3fs): %s params=%r", kind, elapsed, query, args
+            )
+        elif logger.isEnabledFor(logging.DEBUG) and (
+            cls.query_log_sample_rate >= 1.0 or random.random() < cls.query_log_sample_rate
+        ):
+            logger.debug("%s query (%.3fs): %s params=%r", kind, elapsed, query, args)
 
     @staticmethod
     def generate_sql_script(query: str, *args) -> str:
@@ -195,14 +727,21 @@ class Database:
     @asynccontextmanager
     async def transaction(cls):
         """
-        Context manager for database transactions.
+        Context manager for database transactions, always on the primary.
+        
+        Reads made through Database.fetch / fetchrow inside the block go to
+        the primary too, rather than to a replica that may be behind.
         
         Yields:
             Connection: A database connection within a transaction
         """
-        async with cls.connection() as conn:
-            async with conn.transaction():
-                yield conn
+        token = _force_primary.set(True)
+        try:
+            async with cls.connection() as conn:
+                async with conn.transaction():
+                    yield conn
+        finally:
+            _force_primary.reset(token)
 
     @classmethod
     async def health_check(cls):
@@ -220,5 +759,7 @@ class Database:
             return False
 
 
+REGISTRY.register_collector(Database._collect_metrics)
+
 # Apply the decorator to all functions in this module
 apply_decorator_to_module(logger)(__name__)
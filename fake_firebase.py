@@ -0,0 +1,679 @@
+import asyncio
+import copy
+import json
+import queue
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+import httpx
+from firebase_admin import auth
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.watch import ChangeType
+
+from backend_common.common_config import CONF
+from backend_common.firebase_backend import FirebaseBackend
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+FAKE_PROJECT_ID = "fake-project"
+ID_TOKEN_LIFETIME = 3600
+
+
+@dataclass
+class LatencyProfile:
+    """
+    Injected delay in seconds per kind of call, +/- jitter as a fraction of
+    the delay.
+    """
+
+    firestore_read: float = 0.0
+    firestore_write: float = 0.0
+    listener: float = 0.0
+    identity_toolkit: float = 0.0
+    admin_auth: float = 0.0
+    jitter: float = 0.0
+
+    def delay(self, kind: str) -> float:
+        base = getattr(self, kind)
+        if base and self.jitter:
+            base *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(base, 0.0)
+
+    async def sleep(self, kind: str):
+        delay = self.delay(kind)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self, kind: str):
+        delay = self.delay(kind)
+        if delay:
+            time.sleep(delay)
+
+
+def _plain(value: Any) -> Any:
+    """Deep copy into plain dicts and lists, like Firestore's own decoding"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _apply_update(document: dict, field_updates: dict) -> dict:
+    document = copy.deepcopy(document)
+    for key, value in field_updates.items():
+        parts = FieldPath.from_api_repr(key).parts if isinstance(key, str) else key.parts
+        target = document
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        if value is DELETE_FIELD:
+            target.pop(parts[-1], None)
+        else:
+            target[parts[-1]] = _plain(value)
+    return document
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[dict], update_time: Optional[datetime]):
+        self.id = doc_id
+        self._data = data
+        self.update_time = update_time
+        self.exists = data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type: ChangeType, document: FakeDocumentSnapshot):
+        self.type = change_type
+        self.document = document
+
+
+class FakeFirestore:
+    """
+    In-memory Firestore: documents with update times, atomic batched commits
+    and snapshot listeners delivered from their own thread like the real
+    client's. Thread-safe; async and sync clients share one instance.
+    """
+
+    def __init__(self, latency: Optional[LatencyProfile] = None):
+        self.latency = latency or LatencyProfile()
+        # collection -> doc_id -> (data, update_time)
+        self._documents: dict[str, dict[str, tuple[dict, datetime]]] = {}
+        self._watches: dict[str, list["_FakeWatch"]] = {}
+        self._lock = threading.RLock()
+        self._last_time = datetime.now(timezone.utc)
+        self.reads = 0
+        self.writes = 0
+
+    def _now(self) -> datetime:
+        # Strictly increasing, so update times order every commit
+        now = datetime.now(timezone.utc)
+        if now <= self._last_time:
+            now = self._last_time + timedelta(microseconds=1)
+        self._last_time = now
+        return now
+
+    def seed(self, collection_name: str, documents: dict[str, dict]):
+        """Bulk-loads documents without latency or listener events"""
+        with self._lock:
+            now = self._now()
+            target = self._documents.setdefault(collection_name, {})
+            for doc_id, data in documents.items():
+                target[doc_id] = (_plain(data), now)
+
+    def snapshot(self, collection_name: str, doc_id: str) -> FakeDocumentSnapshot:
+        with self._lock:
+            self.reads += 1
+            data, update_time = self._documents.get(collection_name, {}).get(
+                doc_id, (None, None)
+            )
+            return FakeDocumentSnapshot(doc_id, data, update_time)
+
+    def page(self, collection_name: str, after: Optional[str], limit: Optional[int]) -> list:
+        with self._lock:
+            doc_ids = sorted(self._documents.get(collection_name, {}))
+            if after is not None:
+                doc_ids = [doc_id for doc_id in doc_ids if doc_id > after]
+            if limit is not None:
+                doc_ids = doc_ids[:limit]
+            self.reads += len(doc_ids)
+            return [self.snapshot(collection_name, doc_id) for doc_id in doc_ids]
+
+    def commit(self, operations: list[tuple[str, str, str, Any]]):
+        """
+        Applies (kind, collection, doc_id, data) operations atomically. An
+        update of a missing document fails the whole commit with NotFound.
+        """
+        with self._lock:
+            staged = {}
+            for kind, collection_name, doc_id, data in operations:
+                key = (collection_name, doc_id)
+                current = staged.get(key, self._documents.get(collection_name, {}).get(doc_id))
+                if kind == "set":
+                    staged[key] = (_plain(data), None)
+                elif kind == "update":
+                    if current is None:
+                        raise NotFound(f"No document to update: {collection_name}/{doc_id}")
+                    staged[key] = (_apply_update(current[0], data), None)
+                elif kind == "delete":
+                    staged[key] = None
+            now = self._now()
+            changes: dict[str, list[FakeDocumentChange]] = {}
+            for (collection_name, doc_id), value in staged.items():
+                documents = self._documents.setdefault(collection_name, {})
+                existed = doc_id in documents
+                if value is None:
+                    if not existed:
+                        continue
+                    data, _ = documents.pop(doc_id)
+                    change = FakeDocumentChange(
+                        ChangeType.REMOVED, FakeDocumentSnapshot(doc_id, data, now)
+                    )
+                else:
+                    documents[doc_id] = (value[0], now)
+                    change = FakeDocumentChange(
+                        ChangeType.MODIFIED if existed else ChangeType.ADDED,
+                        FakeDocumentSnapshot(doc_id, value[0], now),
+                    )
+                changes.setdefault(collection_name, []).append(change)
+                self.writes += 1
+            for collection_name, collection_changes in changes.items():
+                for watch in self._watches.get(collection_name, ()):
+                    watch.events.put((collection_changes, now))
+
+    def live_documents(self, collection_name: str) -> list[FakeDocumentSnapshot]:
+        with self._lock:
+            return [
+                FakeDocumentSnapshot(doc_id, data, update_time)
+                for doc_id, (data, update_time) in self._documents.get(
+                    collection_name, {}
+                ).items()
+            ]
+
+    def watch(self, collection_name: str, callback: Callable) -> "_FakeWatch":
+        with self._lock:
+            watch = _FakeWatch(self, collection_name, callback)
+            initial = [
+                FakeDocumentChange(ChangeType.ADDED, snapshot)
+                for snapshot in self.live_documents(collection_name)
+            ]
+            watch.events.put((initial, self._now()))
+            self._watches.setdefault(collection_name, []).append(watch)
+        watch.start()
+        return watch
+
+    def _unwatch(self, watch: "_FakeWatch"):
+        with self._lock:
+            watches = self._watches.get(watch.collection_name, [])
+            if watch in watches:
+                watches.remove(watch)
+
+
+class _CollectionSnapshot:
+    """The col_snapshot argument: iterates the collection's current documents"""
+
+    def __init__(self, store: FakeFirestore, collection_name: str):
+        self._store = store
+        self._collection_name = collection_name
+
+    def __iter__(self):
+        return iter(self._store.live_documents(self._collection_name))
+
+
+class _FakeWatch:
+    def __init__(self, store: FakeFirestore, collection_name: str, callback: Callable):
+        self.store = store
+        self.collection_name = collection_name
+        self.callback = callback
+        self.events: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"fake-watch-{collection_name}", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self.store.latency.block("listener")
+            changes, read_time = event
+            try:
+                self.callback(
+                    _CollectionSnapshot(self.store, self.collection_name), changes, read_time
+                )
+            except Exception:
+                logger.exception(f"Fake listener callback for {self.collection_name} failed")
+
+    def unsubscribe(self):
+        self.store._unwatch(self)
+        self.events.put(None)
+
+
+class _FakeDocumentReference:
+    def __init__(self, store: FakeFirestore, collection_name: str, doc_id: str):
+        self._store = store
+        self.collection_name = collection_name
+        self.id = doc_id
+
+    async def get(self) -> FakeDocumentSnapshot:
+        await self._store.latency.sleep("firestore_read")
+        return self._store.snapshot(self.collection_name, self.id)
+
+    async def set(self, data: dict):
+        await self._store.latency.sleep("firestore_write")
+        self._store.commit([("set", self.collection_name, self.id, data)])
+
+    async def update(self, data: dict):
+        await self._store.latency.sleep("firestore_write")
+        self._store.commit([("update", self.collection_name, self.id, data)])
+
+    async def delete(self):
+        await self._store.latency.sleep("firestore_write")
+        self._store.commit([("delete", self.collection_name, self.id, None)])
+
+
+class _FakeQuery:
+    """Document-id ordered paging, as used by the cache warm-up"""
+
+    def __init__(
+        self,
+        store: FakeFirestore,
+        collection_name: str,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+    ):
+        self._store = store
+        self.collection_name = collection_name
+        self._limit = limit
+        self._after = after
+
+    def document(self, doc_id: str) -> _FakeDocumentReference:
+        return _FakeDocumentReference(self._store, self.collection_name, doc_id)
+
+    def order_by(self, field_path: Any) -> "_FakeQuery":
+        return self
+
+    def limit(self, count: int) -> "_FakeQuery":
+        return _FakeQuery(self._store, self.collection_name, count, self._after)
+
+    def start_after(self, document: FakeDocumentSnapshot) -> "_FakeQuery":
+        return _FakeQuery(self._store, self.collection_name, self._limit, document.id)
+
+    async def stream(self):
+        await self._store.latency.sleep("firestore_read")
+        for snapshot in self._store.page(self.collection_name, self._after, self._limit):
+            yield snapshot
+
+
+class _FakeWriteBatch:
+    def __init__(self, store: FakeFirestore):
+        self._store = store
+        self._operations = []
+
+    def set(self, reference: _FakeDocumentReference, data: dict):
+        self._operations.append(("set", reference.collection_name, reference.id, data))
+
+    def update(self, reference: _FakeDocumentReference, data: dict):
+        self._operations.append(("update", reference.collection_name, reference.id, data))
+
+    def delete(self, reference: _FakeDocumentReference):
+        self._operations.append(("delete", reference.collection_name, reference.id, None))
+
+    async def commit(self):
+        await self._store.latency.sleep("firestore_write")
+        self._store.commit(self._operations)
+
+
+class FakeAsyncClient:
+    """The subset of firestore_async.AsyncClient FirestoreDB uses"""
+
+    def __init__(self, store: FakeFirestore):
+        self._store = store
+
+    def collection(self, collection_name: str) -> _FakeQuery:
+        return _FakeQuery(self._store, collection_name)
+
+    def batch(self) -> _FakeWriteBatch:
+        return _FakeWriteBatch(self._store)
+
+    async def get_all(self, references: list[_FakeDocumentReference]):
+        await self._store.latency.sleep("firestore_read")
+        for reference in references:
+            yield self._store.snapshot(reference.collection_name, reference.id)
+
+    def close(self):
+        pass
+
+
+class _FakeSyncCollection:
+    def __init__(self, store: FakeFirestore, collection_name: str):
+        self._store = store
+        self.collection_name = collection_name
+
+    def on_snapshot(self, callback: Callable) -> _FakeWatch:
+        return self._store.watch(self.collection_name, callback)
+
+
+class FakeSyncClient:
+    """The subset of firestore.Client FirestoreDB uses: collection listeners"""
+
+    def __init__(self, store: FakeFirestore):
+        self._store = store
+
+    def collection(self, collection_name: str) -> _FakeSyncCollection:
+        return _FakeSyncCollection(self._store, collection_name)
+
+    def close(self):
+        pass
+
+
+@dataclass
+class FakeUserRecord:
+    uid: str
+    email: str
+    password: str
+    display_name: Optional[str] = None
+    email_verified: bool = True
+    disabled: bool = False
+    tokens_valid_after: float = 0.0
+    custom_claims: dict = field(default_factory=dict)
+
+
+class FakeIdentityToolkit:
+    """
+    In-memory Identity Toolkit: users, ID/refresh tokens and the REST
+    endpoints the app calls (signInWithPassword, token, sendOobCode,
+    resetPassword, update), served through an httpx.MockTransport.
+    """
+
+    def __init__(self, latency: Optional[LatencyProfile] = None):
+        self.latency = latency or LatencyProfile()
+        self.users: dict[str, FakeUserRecord] = {}
+        self._uids_by_email: dict[str, str] = {}
+        self._id_tokens: dict[str, dict] = {}
+        self._refresh_tokens: dict[str, str] = {}
+        self._oob_codes: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def add_user(
+        self,
+        email: str,
+        password: str,
+        display_name: Optional[str] = None,
+        email_verified: bool = True,
+        uid: Optional[str] = None,
+    ) -> FakeUserRecord:
+        with self._lock:
+            if email in self._uids_by_email:
+                raise auth.EmailAlreadyExistsError(
+                    "The user with the provided email already exists", None, None
+                )
+            user = FakeUserRecord(
+                uid=uid or secrets.token_hex(14),
+                email=email,
+                password=password,
+                display_name=display_name,
+                email_verified=email_verified,
+            )
+            self.users[user.uid] = user
+            self._uids_by_email[email] = user.uid
+            return user
+
+    def user_by_email(self, email: str) -> Optional[FakeUserRecord]:
+        uid = self._uids_by_email.get(email)
+        return self.users.get(uid) if uid else None
+
+    def issue_tokens(self, uid: str) -> tuple[str, str]:
+        """Returns a new (id_token, refresh_token) pair for uid"""
+        now = time.time()
+        id_token = f"fake-id.{uid}.{secrets.token_urlsafe(16)}"
+        refresh_token = f"fake-refresh.{secrets.token_urlsafe(24)}"
+        with self._lock:
+            self._id_tokens[id_token] = {
+                "iss": f"https://securetoken.google.com/{FAKE_PROJECT_ID}",
+                "aud": FAKE_PROJECT_ID,
+                "sub": uid,
+                "uid": uid,
+                "iat": int(now),
+                "exp": int(now) + ID_TOKEN_LIFETIME,
+                "email": self.users[uid].email,
+                "email_verified": self.users[uid].email_verified,
+            }
+            self._refresh_tokens[refresh_token] = uid
+        return id_token, refresh_token
+
+    def claims_for(self, id_token: str) -> Optional[dict]:
+        claims = self._id_tokens.get(id_token)
+        return dict(claims) if claims is not None else None
+
+    def revoke(self, uid: str):
+        with self._lock:
+            self.users[uid].tokens_valid_after = time.time()
+            self._refresh_tokens = {
+                token: owner for token, owner in self._refresh_tokens.items() if owner != uid
+            }
+
+    @staticmethod
+    def _error(message: str, status_code: int = 400) -> httpx.Response:
+        return httpx.Response(
+            status_code,
+            json={"error": {"code": status_code, "message": message, "errors": []}},
+        )
+
+    def _uid_from_id_token(self, id_token: str) -> Optional[str]:
+        claims = self.claims_for(id_token or "")
+        if claims is None or claims["exp"] <= time.time():
+            return None
+        return claims["uid"]
+
+    def _sign_in(self, body: dict) -> httpx.Response:
+        user = self.user_by_email(body.get("email", ""))
+        if user is None or user.password != body.get("password") or user.disabled:
+            return self._error("INVALID_LOGIN_CREDENTIALS")
+        id_token, refresh_token = self.issue_tokens(user.uid)
+        return httpx.Response(200, json={
+            "kind": "identitytoolkit#VerifyPasswordResponse",
+            "localId": user.uid,
+            "email": user.email,
+            "displayName": user.display_name or "",
+            "idToken": id_token,
+            "registered": True,
+            "refreshToken": refresh_token,
+            "expiresIn": str(ID_TOKEN_LIFETIME),
+        })
+
+    def _refresh(self, body: dict) -> httpx.Response:
+        uid = self._refresh_tokens.get(body.get("refresh_token", ""))
+        if body.get("grant_type") != "refresh_token" or uid is None:
+            return self._error("INVALID_REFRESH_TOKEN")
+        id_token, _ = self.issue_tokens(uid)
+        return httpx.Response(200, json={
+            "access_token": id_token,
+            "expires_in": str(ID_TOKEN_LIFETIME),
+            "token_type": "Bearer",
+            "refresh_token": body["refresh_token"],
+            "id_token": id_token,
+            "user_id": uid,
+            "project_id": FAKE_PROJECT_ID,
+        })
+
+    def _send_oob_code(self, body: dict) -> httpx.Response:
+        request_type = body.get("requestType")
+        if request_type == "PASSWORD_RESET":
+            user = self.user_by_email(body.get("email", ""))
+        else:
+            uid = self._uid_from_id_token(body.get("idToken"))
+            user = self.users.get(uid) if uid else None
+        if user is None:
+            return self._error("EMAIL_NOT_FOUND" if request_type == "PASSWORD_RESET" else "INVALID_ID_TOKEN")
+        code = secrets.token_urlsafe(16)
+        self._oob_codes[code] = user.uid
+        return httpx.Response(200, json={
+            "kind": "identitytoolkit#GetOobConfirmationCodeResponse",
+            "email": body.get("newEmail", user.email),
+        })
+
+    def _reset_password(self, body: dict) -> httpx.Response:
+        uid = self._oob_codes.pop(body.get("oobCode", ""), None)
+        if uid is None:
+            return self._error("INVALID_OOB_CODE")
+        self.users[uid].password = body.get("newPassword", "")
+        self.revoke(uid)
+        return httpx.Response(200, json={
+            "email": self.users[uid].email, "requestType": "PASSWORD_RESET"
+        })
+
+    def _update(self, body: dict) -> httpx.Response:
+        uid = self._uid_from_id_token(body.get("idToken"))
+        if uid is None:
+            return self._error("INVALID_ID_TOKEN")
+        user = self.users[uid]
+        if "password" in body:
+            user.password = body["password"]
+            self.revoke(uid)
+        id_token, refresh_token = self.issue_tokens(uid)
+        return httpx.Response(200, json={
+            "localId": uid,
+            "email": user.email,
+            "idToken": id_token,
+            "refreshToken": refresh_token,
+            "expiresIn": str(ID_TOKEN_LIFETIME),
+        })
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await self.latency.sleep("identity_toolkit")
+        self.requests += 1
+        endpoint = request.url.path.rstrip("/").rsplit("/", 1)[-1].rsplit(":", 1)[-1]
+        body = json.loads(request.content or b"{}")
+        handler = {
+            "signInWithPassword": self._sign_in,
+            "token": self._refresh,
+            "sendOobCode": self._send_oob_code,
+            "resetPassword": self._reset_password,
+            "update": self._update,
+        }.get(endpoint)
+        if handler is None:
+            return self._error(f"UNSUPPORTED_ENDPOINT: {endpoint}", 404)
+        return handler(body)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+
+class FakeAdminAuth:
+    """
+    The firebase_admin.auth functions the app calls, backed by a
+    FakeIdentityToolkit. Raises the real firebase_admin.auth error types.
+    """
+
+    def __init__(self, toolkit: FakeIdentityToolkit):
+        self._toolkit = toolkit
+
+    def _user(self, uid: str) -> FakeUserRecord:
+        user = self._toolkit.users.get(uid)
+        if user is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided user ID: {uid}")
+        return user
+
+    def get_user(self, uid: str, app=None) -> FakeUserRecord:
+        self._toolkit.latency.block("admin_auth")
+        return self._user(uid)
+
+    def get_user_by_email(self, email: str, app=None) -> FakeUserRecord:
+        self._toolkit.latency.block("admin_auth")
+        user = self._toolkit.user_by_email(email)
+        if user is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided email: {email}")
+        return user
+
+    def create_user(
+        self,
+        email: str,
+        password: str,
+        display_name: Optional[str] = None,
+        email_verified: bool = False,
+        uid: Optional[str] = None,
+        app=None,
+        **kwargs,
+    ) -> FakeUserRecord:
+        self._toolkit.latency.block("admin_auth")
+        return self._toolkit.add_user(email, password, display_name, email_verified, uid)
+
+    def update_user(self, uid: str, app=None, **kwargs) -> FakeUserRecord:
+        self._toolkit.latency.block("admin_auth")
+        user = self._user(uid)
+        for name, value in kwargs.items():
+            if hasattr(user, name):
+                setattr(user, name, value)
+        return user
+
+    def revoke_refresh_tokens(self, uid: str, app=None):
+        self._toolkit.latency.block("admin_auth")
+        self._user(uid)
+        self._toolkit.revoke(uid)
+
+    def verify_id_token(self, id_token: str, app=None, check_revoked: bool = False, **kwargs) -> dict:
+        if check_revoked:
+            self._toolkit.latency.block("admin_auth")
+        if not isinstance(id_token, str) or not id_token:
+            raise ValueError("Illegal ID token provided. ID token must be a non-empty string.")
+        claims = self._toolkit.claims_for(id_token)
+        if claims is None:
+            raise auth.InvalidIdTokenError("Unknown fake ID token")
+        if claims["exp"] <= time.time():
+            raise auth.ExpiredIdTokenError("Token expired", None)
+        if check_revoked:
+            user = self._user(claims["uid"])
+            if user.disabled:
+                raise auth.UserDisabledError("The user record is disabled.")
+            if claims["iat"] < int(user.tokens_valid_after):
+                raise auth.RevokedIdTokenError("The Firebase ID token has been revoked.")
+        return claims
+
+
+class FakeFirebaseBackend(FirebaseBackend):
+    """
+    Fully in-process FirebaseBackend: FakeFirestore for documents and
+    listeners, FakeIdentityToolkit for the REST endpoints and FakeAdminAuth
+    for firebase_admin.auth, all sharing one LatencyProfile.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: Optional[LatencyProfile] = None):
+        self.latency = latency or LatencyProfile()
+        self.firestore = FakeFirestore(self.latency)
+        self.identity_toolkit = FakeIdentityToolkit(self.latency)
+        self._admin_auth = FakeAdminAuth(self.identity_toolkit)
+
+    @classmethod
+    def from_config(cls) -> "FakeFirebaseBackend":
+        return cls(LatencyProfile(**CONF.fake_firebase_latency))
+
+    def admin_auth(self) -> FakeAdminAuth:
+        return self._admin_auth
+
+    def firestore_async_client(self) -> FakeAsyncClient:
+        return FakeAsyncClient(self.firestore)
+
+    def firestore_sync_client(self) -> FakeSyncClient:
+        return FakeSyncClient(self.firestore)
+
+    def http_transport(self) -> httpx.MockTransport:
+        return self.identity_toolkit.transport()
@@ -0,0 +1,53 @@
+from typing import Optional
+
+import httpx
+from firebase_admin import auth, firestore, firestore_async
+from google.oauth2 import service_account
+
+from backend_common.common_config import CONF
+
+
+class FirebaseBackend:
+    """
+    Where FirestoreDB, the Identity Toolkit REST calls and the
+    firebase_admin.auth calls are sent.
+
+    The default implementation talks to Google using CONF.firebase_sp_path.
+    fake_firebase.FakeFirebaseBackend answers everything in-process for
+    offline runs and benchmarks; select it with CONF.firebase_backend = "fake".
+    """
+
+    name = "google"
+
+    def admin_auth(self):
+        """Object with the firebase_admin.auth functions (get_user, verify_id_token, ...)"""
+        return auth
+
+    def firestore_async_client(self):
+        google_auth_creds = service_account.Credentials.from_service_account_file(
+            CONF.firebase_sp_path
+        )
+        return firestore_async.AsyncClient(credentials=google_auth_creds)
+
+    def firestore_sync_client(self):
+        return firestore.Client.from_service_account_json(CONF.firebase_sp_path)
+
+    def http_transport(self) -> Optional[httpx.AsyncBaseTransport]:
+        """Transport for FirebaseHttpClient; None uses the network"""
+        return None
+
+
+_backend: FirebaseBackend = FirebaseBackend()
+
+
+def get_backend() -> FirebaseBackend:
+    return _backend
+
+
+def set_backend(backend: FirebaseBackend):
+    """
+    Switches the process to another backend. Call it before FirestoreDB or
+    FirebaseHttpClient open their clients.
+    """
+    global _backend
+    _backend = backend
@@ -0,0 +1,622 @@
+import mmap
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable, Mapping, MutableMapping
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+# Number of least-recently-used entries compared when evicting under LFU
+_LFU_SAMPLE_SIZE = 16
+# Most documents CollectionCache.apply_batch swaps in per lock hold
+_APPLY_CHUNK_SIZE = 1000
+
+
+@dataclass
+class CachePolicy:
+    """
+    Per-collection cache limits for FirestoreDB.
+
+    The default policy is unbounded, which is what collections fully mirrored
+    by a snapshot listener need. Setting max_entries and/or max_bytes turns the
+    collection into a bounded on-demand cache.
+    """
+
+    max_entries: Optional[int] = None
+    max_bytes: Optional[int] = None
+    eviction: str = "lru"  # "lru" or "lfu"
+    ttl_seconds: Optional[float] = None
+    mirrored: bool = False  # listener keeps every document; never evict
+    # How long a confirmed-missing document is remembered (None/0 disables)
+    negative_ttl_seconds: Optional[float] = 10.0
+    # How documents are held in memory:
+    #   "dict": as given
+    #   "interned": dicts with interned key strings, shared across documents
+    #   "packed": pickled bytes, decoded on every read (reads return a copy)
+    #   "tiered": the hot_max_entries most recently used documents as dicts,
+    #             the rest zlib-compressed and promoted back when read
+    storage: str = "dict"
+    # Hand out frozen documents that readers can share without copying.
+    # Opt-in: callers of the collection must not edit documents they read
+    # (derive new versions with assoc_in() or thaw() instead).
+    read_only: bool = False
+    hot_max_entries: int = 10000
+    cold_compression_level: int = 1
+
+    @property
+    def bounded(self) -> bool:
+        return not self.mirrored and bool(self.max_entries or self.max_bytes)
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "CachePolicy":
+        return cls(**(config or {}))
+
+
+def get_field(document: Any, field_path: str) -> Any:
+    """Resolves a dotted field path such as "settings.show_price_on_purchase"."""
+    value = document
+    for part in field_path.split("."):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(
+        "Cached Firestore documents are read-only; "
+        "build a new version with assoc_in() or a mutable copy with thaw()"
+    )
+
+
+class FrozenDict(dict):
+    """
+    A dict that refuses mutation. Still a dict for json, pydantic and the
+    Firestore client. copy.copy() and copy.deepcopy() return mutable copies,
+    since callers copy a document in order to edit it.
+    """
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+class FrozenList(list):
+    """A list that refuses mutation; see FrozenDict."""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = clear = _read_only
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value: Any, intern: bool = False) -> Any:
+    """
+    Returns a read-only version of a document. Already frozen subtrees are
+    reused as-is, so re-freezing an edited version only copies what changed.
+    """
+    kind = type(value)
+    if kind is FrozenDict or kind is FrozenList:
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({
+            sys.intern(key) if intern and type(key) is str else key: freeze(item, intern)
+            for key, item in value.items()
+        })
+    if isinstance(value, list):
+        return FrozenList([freeze(item, intern) for item in value])
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Returns a fully mutable deep copy of a (possibly frozen) document"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+def assoc_in(document: Mapping, path: tuple, value: Any) -> FrozenDict:
+    """
+    Returns a new frozen version of document with path set to value. Only the
+    maps along path are copied; every other subtree is shared.
+    """
+    head, rest = path[0], path[1:]
+    if rest:
+        child = document.get(head)
+        value = assoc_in(child if isinstance(child, Mapping) else FrozenDict(), rest, value)
+    else:
+        value = freeze(value)
+    updated = dict(document)
+    updated[head] = value
+    return FrozenDict(updated)
+
+
+def dissoc_in(document: Mapping, path: tuple) -> Mapping:
+    """Returns a new frozen version of document without path; see assoc_in"""
+    head, rest = path[0], path[1:]
+    if head not in document:
+        return document
+    updated = dict(document)
+    if rest:
+        child = document[head]
+        if not isinstance(child, Mapping):
+            return document
+        updated[head] = dissoc_in(child, rest)
+    else:
+        del updated[head]
+    return FrozenDict(updated)
+
+
+def intern_keys(obj: Any) -> Any:
+    """
+    Rebuilds nested dicts and lists with interned key strings, so the same
+    field names are stored once per process instead of once per document.
+    """
+    if isinstance(obj, dict):
+        return {
+            sys.intern(key) if type(key) is str else key: intern_keys(value)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, list):
+        return [intern_keys(item) for item in obj]
+    return obj
+
+
+class _ColdValue:
+    """A demoted document in a tiered cache: compressed pickle bytes."""
+
+    __slots__ = ("blob",)
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    Approximates the memory held by a Firestore document in bytes.
+    """
+    size = sys.getsizeof(obj)
+    if type(obj) is _ColdValue:
+        return size + sys.getsizeof(obj.blob)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += estimate_size(key) + estimate_size(value)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += estimate_size(item)
+    return size
+
+
+class CollectionCache(MutableMapping):
+    """
+    Cache of one Firestore collection, keyed by document id.
+
+    Behaves like the plain dict it replaces, but enforces the collection's
+    CachePolicy (entry/byte limits, LRU or sampled-LFU eviction, TTL) and keeps
+    hit/miss/eviction counters. Mutations take a lock because snapshot
+    listeners write from their own thread.
+
+    Secondary indexes map a (dotted) field value to the ids of the cached
+    documents holding it, and are maintained on every write and removal.
+
+    Documents are stored according to policy.storage; see CachePolicy. With
+    policy.read_only they are frozen on write (FrozenDict/FrozenList), so
+    reads return the cached object itself and callers derive new versions
+    with assoc_in()/dissoc_in() or {**document, ...} instead of copying.
+    """
+
+    def __init__(self, policy: Optional[CachePolicy] = None, indexes: Iterable[str] = ()):
+        self.policy = policy or CachePolicy()
+        # doc_id -> [value, size_bytes, expires_at, use_count, indexed_values]
+        self._entries: OrderedDict[str, list] = OrderedDict()
+        # field -> value -> doc_ids
+        self._indexes: dict[str, dict[Any, set]] = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        # doc_id -> monotonic expiry of a "document does not exist" entry
+        self._missing: dict[str, float] = {}
+        # Hot tier of a "tiered" cache, least recently used first
+        self._hot: OrderedDict[str, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.promotions = 0
+        self.demotions = 0
+        for field_path in indexes:
+            self.add_index(field_path)
+
+    def _encode(self, value: Any) -> Any:
+        storage = self.policy.storage
+        if storage == "packed":
+            # Every read decodes a private copy, so nothing to freeze
+            return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.policy.read_only:
+            return freeze(value, intern=storage == "interned")
+        if storage == "interned":
+            return intern_keys(value)
+        return value
+
+    def _decode(self, stored: Any) -> Any:
+        if self.policy.storage == "packed":
+            return pickle.loads(stored)
+        if type(stored) is _ColdValue:
+            return pickle.loads(zlib.decompress(stored.blob))
+        return stored
+
+    def _resize(self, entry: list):
+        if self.policy.max_bytes:
+            size = estimate_size(entry[0])
+            self._bytes += size - entry[1]
+            entry[1] = size
+
+    def _make_hot(self, doc_id: str, entry: list):
+        """Promotes doc_id to most recently used in the hot tier, demoting the coldest"""
+        if type(entry[0]) is _ColdValue:
+            entry[0] = self._decode(entry[0])
+            self._resize(entry)
+            self.promotions += 1
+        self._hot[doc_id] = None
+        self._hot.move_to_end(doc_id)
+        while len(self._hot) > self.policy.hot_max_entries:
+            cold_id, _ = self._hot.popitem(last=False)
+            cold_entry = self._entries[cold_id]
+            cold_entry[0] = self._compress(cold_entry[0])
+            self._resize(cold_entry)
+            self.demotions += 1
+
+    def _compress(self, value: Any) -> _ColdValue:
+        return _ColdValue(zlib.compress(
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+            self.policy.cold_compression_level,
+        ))
+
+    def _expired(self, entry: list) -> bool:
+        return entry[2] is not None and entry[2] <= time.monotonic()
+
+    def _index_values(self, value: Any) -> dict:
+        indexed = {}
+        for field_path in self._indexes:
+            field_value = get_field(value, field_path)
+            if isinstance(field_value, Hashable) and field_value is not None:
+                indexed[field_path] = field_value
+        return indexed
+
+    def _index(self, doc_id: str, indexed: dict):
+        for field_path, field_value in indexed.items():
+            self._indexes[field_path].setdefault(field_value, set()).add(doc_id)
+
+    def _unindex(self, doc_id: str, indexed: dict):
+        for field_path, field_value in indexed.items():
+            doc_ids = self._indexes[field_path].get(field_value)
+            if doc_ids is not None:
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del self._indexes[field_path][field_value]
+
+    def _drop(self, doc_id: str) -> list:
+        entry = self._entries.pop(doc_id)
+        self._hot.pop(doc_id, None)
+        self._bytes -= entry[1]
+        self._unindex(doc_id, entry[4])
+        return entry
+
+    def add_index(self, field_path: str):
+        """Declares a secondary index and builds it from the cached documents"""
+        with self._lock:
+            if field_path in self._indexes:
+                return
+            self._indexes[field_path] = {}
+            for doc_id, entry in self._entries.items():
+                field_value = get_field(self._decode(entry[0]), field_path)
+                if isinstance(field_value, Hashable) and field_value is not None:
+                    entry[4][field_path] = field_value
+                    self._indexes[field_path].setdefault(field_value, set()).add(doc_id)
+
+    @property
+    def indexes(self) -> list[str]:
+        return list(self._indexes)
+
+    def lookup(self, field_path: str, value: Any) -> list:
+        """
+        Cached documents whose field_path equals value, in O(k). Does not
+        touch recency or counters. Raises KeyError for undeclared indexes.
+        """
+        with self._lock:
+            doc_ids = self._indexes[field_path].get(value, ())
+            return [
+                self._decode(self._entries[doc_id][0])
+                for doc_id in doc_ids
+                if not self._expired(self._entries[doc_id])
+            ]
+
+    def _evict(self):
+        policy = self.policy
+        while self._entries and (
+            (policy.max_entries and len(self._entries) > policy.max_entries)
+            or (policy.max_bytes and self._bytes > policy.max_bytes)
+        ):
+            if policy.eviction == "lfu":
+                sample = []
+                for doc_id, entry in self._entries.items():
+                    sample.append((entry[3], doc_id))
+                    if len(sample) >= _LFU_SAMPLE_SIZE:
+                        break
+                victim = min(sample)[1]
+            else:
+                victim = next(iter(self._entries))
+            self._drop(victim)
+            self.evictions += 1
+
+    def __getitem__(self, doc_id: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is None:
+                self.misses += 1
+                raise KeyError(doc_id)
+            if self._expired(entry):
+                self._drop(doc_id)
+                self.expirations += 1
+                self.misses += 1
+                raise KeyError(doc_id)
+            self._entries.move_to_end(doc_id)
+            entry[3] += 1
+            self.hits += 1
+            if self.policy.storage == "tiered":
+                self._make_hot(doc_id, entry)
+            stored = entry[0]
+        return self._decode(stored)
+
+    def _prepare(self, value: Any, cold: bool = False) -> list:
+        """
+        Builds the entry for value (encoding, size, index values) without
+        taking the lock. cold stores it compressed in a tiered cache.
+        """
+        policy = self.policy
+        indexed = self._index_values(value) if self._indexes else {}
+        value = self._encode(value)
+        if cold:
+            value = self._compress(value)
+        size = estimate_size(value) if policy.max_bytes else 0
+        expires_at = time.monotonic() + policy.ttl_seconds if policy.ttl_seconds else None
+        return [value, size, expires_at, 0, indexed]
+
+    def _store(self, doc_id: str, entry: list):
+        """Swaps a _prepare()d entry into place; the caller holds the lock"""
+        self._missing.pop(doc_id, None)
+        previous = self._entries.get(doc_id)
+        if previous is not None:
+            self._bytes -= previous[1]
+            self._unindex(doc_id, previous[4])
+            entry[3] = previous[3]
+        self._entries[doc_id] = entry
+        self._entries.move_to_end(doc_id)
+        self._index(doc_id, entry[4])
+        self._bytes += entry[1]
+        if self.policy.storage == "tiered":
+            if type(entry[0]) is _ColdValue:
+                self._hot.pop(doc_id, None)
+            else:
+                self._make_hot(doc_id, entry)
+
+    def __setitem__(self, doc_id: str, value: Any):
+        self.put(doc_id, value)
+
+    def put(self, doc_id: str, value: Any) -> Any:
+        """
+        Caches value and returns it the way reads will (frozen under
+        policy.read_only, a private copy with "packed" storage).
+        """
+        entry = self._prepare(value)
+        with self._lock:
+            self._store(doc_id, entry)
+            if self.policy.bounded:
+                self._evict()
+        return self._decode(entry[0])
+
+    def __delitem__(self, doc_id: str):
+        with self._lock:
+            self._drop(doc_id)
+
+    def pop(self, doc_id: str, *default):
+        with self._lock:
+            if doc_id not in self._entries:
+                if default:
+                    return default[0]
+                raise KeyError(doc_id)
+            return self._decode(self._drop(doc_id)[0])
+
+    def apply_batch(
+        self,
+        upserts: Mapping[str, Any],
+        removals: Iterable[str] = (),
+        only_cached: bool = False,
+    ) -> tuple[int, int]:
+        """
+        Applies one snapshot's changes. Documents are encoded and indexed
+        before the lock is taken; the lock is only held to swap the prepared
+        entries into place, at most _APPLY_CHUNK_SIZE of them per hold so
+        request handlers never wait long. A batch up to that size is applied
+        atomically (readers see all of it or none); larger ones, like a bulk
+        import, become visible chunk by chunk. With only_cached, upserts only
+        refresh documents already held. Returns (updated, removed) counts.
+
+        In a tiered cache, upserts beyond the free room of the hot tier are
+        compressed up front instead of demoting hot documents under the lock.
+        """
+        tiered = self.policy.storage == "tiered"
+        hot_room = max(self.policy.hot_max_entries - len(self._hot), 0)
+        prepared = {}
+        for doc_id, value in upserts.items():
+            if only_cached and doc_id not in self._entries:
+                continue
+            cold = False
+            if tiered and doc_id not in self._hot:
+                cold = hot_room == 0
+                hot_room = max(hot_room - 1, 0)
+            prepared[doc_id] = self._prepare(value, cold)
+
+        # Removals first, then upserts, in lock-sized chunks
+        changes = [(doc_id, None) for doc_id in removals]
+        changes.extend(prepared.items())
+        for doc_id in upserts:
+            # The document exists now
+            self._missing.pop(doc_id, None)
+
+        updated = removed = 0
+        for start in range(0, len(changes) or 1, _APPLY_CHUNK_SIZE):
+            if start:
+                # Let waiting threads take the lock between chunks
+                time.sleep(0)
+            with self._lock:
+                for doc_id, entry in changes[start: start + _APPLY_CHUNK_SIZE]:
+                    if entry is None:
+                        if doc_id in self._entries:
+                            self._drop(doc_id)
+                            removed += 1
+                    # Rechecked: the document may have been dropped meanwhile
+                    elif not only_cached or doc_id in self._entries:
+                        self._store(doc_id, entry)
+                        updated += 1
+                if self.policy.bounded:
+                    self._evict()
+        return updated, removed
+
+    def mark_missing(self, doc_id: str):
+        """Remembers that doc_id does not exist for policy.negative_ttl_seconds"""
+        ttl = self.policy.negative_ttl_seconds
+        if ttl:
+            with self._lock:
+                # A write that raced the failed fetch wins
+                if doc_id not in self._entries:
+                    self._missing[doc_id] = time.monotonic() + ttl
+
+    def clear_missing(self, doc_id: str):
+        self._missing.pop(doc_id, None)
+
+    def is_known_missing(self, doc_id: str) -> bool:
+        expires_at = self._missing.get(doc_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            self._missing.pop(doc_id, None)
+            return False
+        self.negative_hits += 1
+        return True
+
+    def __contains__(self, doc_id: object) -> bool:
+        entry = self._entries.get(doc_id)
+        return entry is not None and not self._expired(entry)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def values(self):
+        """Snapshot of cached documents; does not touch recency or counters."""
+        with self._lock:
+            stored = [entry[0] for entry in self._entries.values() if not self._expired(entry)]
+        return [self._decode(value) for value in stored]
+
+    def items(self):
+        """Snapshot of (doc_id, document) pairs; does not touch recency or counters."""
+        with self._lock:
+            stored = [
+                (doc_id, entry[0])
+                for doc_id, entry in self._entries.items()
+                if not self._expired(entry)
+            ]
+        return [(doc_id, self._decode(value)) for doc_id, value in stored]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hot.clear()
+            self._missing.clear()
+            for index in self._indexes.values():
+                index.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self._bytes if self.policy.max_bytes else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "negative_entries": len(self._missing),
+            "negative_hits": self.negative_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hot_entries": len(self._hot),
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+        }
+
+
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path: str, collection_name: str, documents: dict, read_time: Any):
+    """
+    Atomically writes a collection snapshot: the documents plus the read time
+    they are consistent with.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "collection": collection_name,
+        "read_time": read_time,
+        "documents": documents,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str, collection_name: str) -> Optional[dict]:
+    """
+    Memory-maps and loads a snapshot written by write_snapshot. Returns None
+    when the file is missing, unreadable or belongs to another collection.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            payload = pickle.loads(mm)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if (
+        payload.get("version") != SNAPSHOT_VERSION
+        or payload.get("collection") != collection_name
+    ):
+        return None
+    return payload
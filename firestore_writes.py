@@ -0,0 +1,250 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Union
+
+from google.cloud.firestore_v1 import DELETE_FIELD
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from backend_common.firestore_cache import FrozenDict, assoc_in, dissoc_in, freeze
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batched writes with more operations than this
+MAX_BATCH_OPERATIONS = 500
+
+FieldKey = Union[str, tuple]
+
+
+def _as_path(key: FieldKey) -> tuple:
+    return key if isinstance(key, tuple) else (key,)
+
+
+def _apply_field(document: dict, path: tuple, value: Any) -> FrozenDict:
+    """Returns a new version of document with one field update applied."""
+    if value is DELETE_FIELD:
+        return dissoc_in(document, path)
+    return assoc_in(document, path, value)
+
+
+def diff_fields(old: dict, new: dict, prefix: tuple = ()) -> dict[tuple, Any]:
+    """
+    Structural diff of two document dicts as a Firestore field update.
+
+    Returns {path tuple: value} for every changed leaf, recursing into maps
+    present on both sides, with DELETE_FIELD for fields only in old. Applying
+    the result to old yields new. Empty maps and keys that cannot be part of
+    a field path are written whole at their parent.
+    """
+    changes = {}
+    for key, value in new.items():
+        path = prefix + (key,)
+        if key not in old:
+            changes[path] = value
+            continue
+        previous = old[key]
+        if previous is value or previous == value:
+            continue
+        if (
+            isinstance(previous, dict)
+            and isinstance(value, dict)
+            and value
+            and all(isinstance(k, str) and k for k in previous.keys() | value.keys())
+        ):
+            changes.update(diff_fields(previous, value, path))
+        else:
+            changes[path] = value
+    for key in old.keys() - new.keys():
+        changes[prefix + (key,)] = DELETE_FIELD
+    return changes
+
+
+class _PendingWrite:
+    __slots__ = ("kind", "data")
+
+    def __init__(self, kind: str, data: dict):
+        # "set": data is the full document
+        # "update": data maps field path tuples to values
+        self.kind = kind
+        self.data = data
+
+
+class WriteBehindQueue:
+    """
+    Coalescing write-behind queue for Firestore document writes.
+
+    Pending writes are kept per (collection, doc_id): a set replaces whatever
+    is pending, an update is folded into a pending set's document or merged
+    field by field into a pending update (last write wins per field). Writes
+    are flushed in Firestore batched writes of up to max_batch operations when
+    max_batch documents are pending or every flush_interval seconds, and
+    drained by close().
+    """
+
+    def __init__(
+        self,
+        get_client: Callable,
+        max_batch: int = MAX_BATCH_OPERATIONS,
+        flush_interval: float = 0.5,
+    ):
+        self._get_client = get_client
+        self.max_batch = min(max_batch, MAX_BATCH_OPERATIONS)
+        self.flush_interval = flush_interval
+        self._pending: OrderedDict[tuple, _PendingWrite] = OrderedDict()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.enqueued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._closing or (self._task is not None and not self._task.done()):
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop (sync scripts); writes wait for an explicit flush()
+            return
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def _enqueued(self, key: tuple):
+        self.enqueued += 1
+        self._ensure_started()
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def enqueue_set(self, collection_name: str, doc_id: str, data: dict):
+        """Queues a full-document set, superseding any pending write."""
+        key = (collection_name, doc_id)
+        if key in self._pending:
+            self.coalesced += 1
+        # Frozen so later caller edits cannot leak into the queued write
+        self._pending[key] = _PendingWrite("set", freeze(data))
+        self._enqueued(key)
+
+    def enqueue_update(self, collection_name: str, doc_id: str, fields: dict[FieldKey, Any]):
+        """
+        Queues a field update. Keys are top-level field names or tuples of
+        path segments; DELETE_FIELD removes a field.
+        """
+        key = (collection_name, doc_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _PendingWrite("update", {})
+        else:
+            self.coalesced += 1
+        for field_key, value in fields.items():
+            path = _as_path(field_key)
+            value = freeze(value)
+            if pending.kind == "set":
+                pending.data = _apply_field(pending.data, path, value)
+            else:
+                self._merge_update(pending.data, path, value)
+        self._enqueued(key)
+
+    @staticmethod
+    def _merge_update(pending: dict, path: tuple, value: Any):
+        # A later write to a field supersedes pending writes below it
+        for existing in [p for p in pending if p[: len(path)] == path]:
+            del pending[existing]
+        # ...and is folded into a pending write to a field above it
+        for depth in range(1, len(path)):
+            ancestor = path[:depth]
+            if ancestor in pending:
+                parent = pending[ancestor]
+                if not isinstance(parent, dict):
+                    parent = FrozenDict()
+                pending[ancestor] = _apply_field(parent, path[depth:], value)
+                return
+        pending[path] = value
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def _add_to_batch(self, batch, key: tuple, write: _PendingWrite):
+        collection_name, doc_id = key
+        doc_ref = self._get_client().collection(collection_name).document(doc_id)
+        if write.kind == "set":
+            batch.set(doc_ref, write.data)
+        else:
+            batch.update(
+                doc_ref,
+                {FieldPath(*path).to_api_repr(): value for path, value in write.data.items()},
+            )
+
+    async def _write_one(self, key: tuple, write: _PendingWrite):
+        batch = self._get_client().batch()
+        self._add_to_batch(batch, key, write)
+        try:
+            await batch.commit()
+            self.written += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Write-behind {write.kind} of {key[0]}/{key[1]} failed: {e}")
+
+    async def flush(self):
+        """Writes everything pending, max_batch operations per batched write."""
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        async with self._flush_lock:
+            while self._pending:
+                chunk = []
+                while self._pending and len(chunk) < self.max_batch:
+                    chunk.append(self._pending.popitem(last=False))
+                batch = self._get_client().batch()
+                for key, write in chunk:
+                    self._add_to_batch(batch, key, write)
+                try:
+                    await batch.commit()
+                    self.written += len(chunk)
+                    self.batches += 1
+                except Exception as e:
+                    # Batched writes are atomic, so one bad write (e.g. an
+                    # update of a deleted document) fails all of them; retry
+                    # individually to isolate it.
+                    logger.warning(
+                        f"Write-behind batch of {len(chunk)} failed ({e}), "
+                        "retrying writes individually"
+                    )
+                    for key, write in chunk:
+                        await self._write_one(key, write)
+
+    async def close(self):
+        """Stops the background flusher and drains pending writes."""
+        # Signalled rather than cancelled: a cancel racing the wakeup event can
+        # be swallowed by asyncio.wait_for on older Pythons
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self._closing = False
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
@@ -0,0 +1,98 @@
+import asyncio
+from typing import Optional
+
+import httpx
+
+from backend_common.common_config import CONF
+from backend_common.firebase_backend import get_backend
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FirebaseHttpClient:
+    """
+    Shared async HTTP client for the Identity Toolkit REST endpoints.
+
+    A single pooled httpx.AsyncClient is kept for the whole process so that
+    connections, TLS sessions and HTTP/2 streams are reused across requests.
+    It is opened and closed together with the app lifespan.
+    """
+
+    client: Optional[httpx.AsyncClient] = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def open(cls):
+        """
+        Creates the pooled client if it does not exist yet.
+        """
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls.client is None:
+                cls.client = httpx.AsyncClient(
+                    http2=True,
+                    timeout=CONF.firebase_http_timeout,
+                    limits=httpx.Limits(
+                        max_connections=CONF.firebase_http_max_connections,
+                        max_keepalive_connections=CONF.firebase_http_max_keepalive,
+                        keepalive_expiry=CONF.firebase_http_keepalive_expiry,
+                    ),
+                    transport=get_backend().http_transport(),
+                )
+                logger.info("Opened Firebase HTTP client")
+        return cls.client
+
+    @classmethod
+    async def close(cls):
+        """
+        Closes the pooled client and releases its connections.
+        """
+        if cls.client is not None:
+            await cls.client.aclose()
+            logger.info("Closed Firebase HTTP client")
+        cls.client = None
+
+    @classmethod
+    async def get_client(cls) -> httpx.AsyncClient:
+        """
+        Returns the pooled client, opening it lazily when the app lifespan
+        has not done so (scripts, tests).
+        """
+        if cls.client is None:
+            await cls.open()
+        return cls.client
+
+    @staticmethod
+    def endpoint_name(url: str) -> str:
+        """
+        Extracts the endpoint name from a CONF.firebase_* url,
+        e.g. ".../accounts:signInWithPassword?key=" -> "signInWithPassword".
+        """
+        path = url.split("?", 1)[0].rstrip("/")
+        return path.rsplit("/", 1)[-1].rsplit(":", 1)[-1]
+
+    @classmethod
+    def timeout_for(cls, url: str) -> float:
+        """
+        Returns the configured timeout for the endpoint behind url.
+        """
+        return CONF.firebase_http_endpoint_timeouts.get(
+            cls.endpoint_name(url), CONF.firebase_http_timeout
+        )
+
+    @classmethod
+    async def post(cls, url: str, payload: dict) -> httpx.Response:
+        """
+        Posts a JSON payload using the per-endpoint timeout.
+
+        Args:
+            url: Full request url including the api key
+            payload: JSON body
+
+        Returns:
+            Response: The raw httpx response
+        """
+        client = await cls.get_client()
+        return await client.post(url, json=payload, timeout=cls.timeout_for(url))
@@ -0,0 +1,121 @@
+import bisect
+import threading
+from typing import Callable, Iterable, Optional
+
+# Seconds; suits both cache-miss fetches and listener lag
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (name, type, help, labels, value) as yielded by collectors
+Sample = tuple[str, str, str, dict, float]
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, in the Prometheus model.
+    observe() is safe to call from listener threads.
+    """
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels tuple -> [bucket counts..., +Inf count, sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def summary(self, **labels) -> dict:
+        """Count, sum and mean of one label set"""
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            if series is None:
+                return {"count": 0, "sum": 0.0, "mean": 0.0}
+            count = sum(series[:-1])
+            return {"count": count, "sum": series[-1], "mean": series[-1] / count if count else 0.0}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in Prometheus text format.
+
+    Histograms are recorded as events happen. Counters and gauges that
+    already exist as plain attributes (cache hit counts, sizes) are read by
+    collector callbacks at scrape time, so the hot path pays nothing extra.
+    """
+
+    def __init__(self):
+        self._histograms: dict[str, Histogram] = {}
+        self._collectors: list[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def histogram(
+        self, name: str, help: str, buckets: Optional[Iterable[float]] = None
+    ) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, help, buckets or DEFAULT_BUCKETS)
+            return self._histograms[name]
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[Sample]]):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = list(self._histograms.values())
+            collectors = list(self._collectors)
+        # Samples of one metric must be contiguous in the exposition format
+        families: dict[str, list[str]] = {}
+        for collector in collectors:
+            for name, kind, help, labels, value in collector():
+                if name not in families:
+                    families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                families[name].append(f"{name}{_format_labels(labels)} {value}")
+        lines = [line for family in families.values() for line in family]
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,147 @@
+import json
+import re
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from backend_common.common_config import CONF
+
+# Everything except quotes and brackets, deleted before counting nesting depth
+_NON_STRUCTURAL = bytes(b for b in range(256) if b not in b'"{}[]')
+_BRACKETED_STRING = re.compile(rb'"[^"]*"')
+_USER_ID_KEY = re.compile(rb'"user_id"\s*:\s*')
+_JSON_DECODER = json.JSONDecoder()
+
+T = TypeVar("T", bound=BaseModel)
+
+
+async def get_cached_request_body(request: Request) -> Any:
+    """
+    Returns the parsed request body, parsing it at most once per request.
+
+    Multipart/form bodies come back as FormData, everything else as decoded
+    JSON. The result is kept on request.state.parsed_body so that JWTBearer
+    and the endpoint handler share one parse.
+    """
+    if hasattr(request.state, "parsed_body"):
+        return request.state.parsed_body
+    content_type = request.headers.get("content-type", "")
+    if "multipart/form-data" in content_type:
+        parsed = await request.form()
+    else:
+        parsed = await request.json()
+    request.state.parsed_body = parsed
+    return parsed
+
+
+def cached_body(model: type[T]) -> Callable[[Request], Any]:
+    """
+    Dependency validating model against the cached parse of the request body.
+
+    FastAPI parses the body again for a plain pydantic body parameter; an
+    endpoint behind JWTBearer declares `req: ReqX = Depends(cached_body(ReqX))`
+    instead to reuse the parse JWTBearer already made.
+    """
+
+    async def dependency(request: Request) -> T:
+        body = await get_cached_request_body(request)
+        try:
+            return model.model_validate(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors()) from e
+
+    return dependency
+
+
+def _bracket_depth(segment: bytes) -> int:
+    """
+    Returns the change in JSON nesting depth across segment, ignoring
+    brackets inside string literals. segment must not start or end inside a
+    string and must not contain backslashes, so every quote is a string
+    delimiter. Every step is a single C-level pass.
+    """
+    segment = segment.translate(None, _NON_STRUCTURAL)
+    # Removing adjacent quote pairs keeps every bracket on the same side of
+    # the string boundaries; what is left are the few strings with brackets.
+    segment = _BRACKETED_STRING.sub(b"", segment.replace(b'""', b""))
+    return (
+        segment.count(b"{") + segment.count(b"[")
+        - segment.count(b"}") - segment.count(b"]")
+    )
+
+
+def _top_level_user_id(body: bytes) -> tuple[bool, Optional[str]]:
+    """
+    Finds the top-level "user_id" of a JSON object without decoding the rest
+    of the document. Only the value itself is decoded; the nesting depth of
+    each candidate key is tracked across the segments between candidates.
+
+    Returns (found, user_id). Like json.loads, the last top-level key wins.
+    Raises ValueError when the value cannot be decoded from its prefix.
+    body must not contain backslashes: an escaped quote inside a key such as
+    "foo \\"user_id" would otherwise be taken for the start of the key.
+    """
+    found, user_id = False, None
+    depth, last = 0, 0
+    for match in _USER_ID_KEY.finditer(body):
+        # Without backslashes every quote is a delimiter, and in valid JSON
+        # a '"user_id":' match can only be a key, so segment boundaries are
+        # safe.
+        depth += _bracket_depth(body[last: match.start()])
+        last = match.end()
+        if depth != 1:
+            continue
+        window = body[match.end(): match.end() + 1024].decode("utf-8", "ignore")
+        user_id, _ = _JSON_DECODER.raw_decode(window)
+        found = True
+    return found, user_id
+
+
+async def extract_user_id(request: Request) -> Optional[str]:
+    """
+    Extracts the user_id a request claims to act for.
+
+    - multipart: "user_id" form field, or request_body.user_id inside the
+      JSON "data" field
+    - JSON: top-level "user_id"
+
+    Small JSON bodies are parsed once and cached for the handler (see
+    cached_body). Bodies larger than CONF.request_body_scan_threshold that
+    contain the literal key and no backslash at all are scanned for it
+    instead of being decoded; anything else is fully decoded, since escapes
+    can spell the key differently or hide a quote. Raises json.JSONDecodeError on
+    a malformed or empty JSON body.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if "multipart/form-data" in content_type:
+        form = await get_cached_request_body(request)
+        if "data" in form:
+            if not hasattr(request.state, "form_data_json"):
+                request.state.form_data_json = json.loads(form["data"])
+            return request.state.form_data_json.get("request_body", {}).get("user_id")
+        return form.get("user_id")
+
+    if hasattr(request.state, "parsed_body"):
+        return request.state.parsed_body.get("user_id")
+
+    body = await request.body()
+    if not body.strip():
+        raise json.JSONDecodeError("Empty request body", "", 0)
+    # Many nested "user_id" keys make the scan slower than a full decode
+    if (
+        len(body) > CONF.request_body_scan_threshold
+        and b"\\" not in body
+        and 0 < body.count(b'"user_id"') <= 8
+    ):
+        try:
+            found, user_id = _top_level_user_id(body)
+            if found:
+                return user_id
+        except ValueError:
+            pass
+
+    request_body = await get_cached_request_body(request)
+    return request_body.get("user_id")
@@ -0,0 +1,483 @@
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Hashable, Iterable, Mapping, MutableMapping
+from typing import Any, Callable, Iterator, Optional
+
+from backend_common.firestore_cache import CachePolicy, FrozenDict, freeze, get_field, thaw
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS doc_index (
+    collection TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    PRIMARY KEY (collection, field, value, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS doc_index_by_doc ON doc_index (collection, doc_id);
+CREATE TABLE IF NOT EXISTS collections (
+    collection TEXT PRIMARY KEY,
+    ready INTEGER NOT NULL DEFAULT 0,
+    read_time BLOB
+);
+"""
+
+
+# Marks a queued deletion in SharedCollectionCache._pending
+_DELETED = object()
+
+
+def _index_key(value: Any) -> str:
+    # Keeps 1, "1" and True apart in the TEXT column
+    return f"{type(value).__name__}:{value!r}"
+
+
+class SharedCacheStore:
+    """
+    Local SQLite file shared by every worker process on a host.
+
+    The database runs in WAL mode so readers in any process never block the
+    writer, and is memory-mapped so reads come straight from the shared page
+    cache. Exactly one process holds an exclusive flock on "<path>.lock"; that
+    leader runs the Firestore warm-up and snapshot listeners and publishes
+    documents, while the other workers only read. If the leader exits, the
+    lock is released and another worker takes over.
+
+    Writes are queued to one writer thread per process and committed in
+    order, so callers (request handlers on the event loop included) never
+    wait for another process's transaction. Reads on other threads use a
+    short busy timeout of read_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mmap_size: int = 256 * 1024 * 1024,
+        read_timeout: float = 0.5,
+        write_timeout: float = 30.0,
+    ):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.is_leader = False
+        self._lock_file = None
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=write_timeout, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """Per-thread connection; the listener runs on its own thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            is_writer = threading.current_thread() is self._writer
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.write_timeout if is_writer else self.read_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            self._connections.append(conn)
+        return conn
+
+    def try_acquire_leadership(self) -> bool:
+        """Takes the leader lock without blocking. Returns True when held."""
+        if self.is_leader:
+            return True
+        # Unix only; imported here so the module loads where no shared cache is used
+        import fcntl
+
+        lock_file = open(f"{self.path}.lock", "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_leader = True
+        logger.info(f"Process {os.getpid()} is the shared cache leader for {self.path}")
+        return True
+
+    def write(
+        self,
+        statements: Iterable[tuple[str, tuple]],
+        on_done: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Queues statements to run in one IMMEDIATE transaction on the writer
+        thread and returns at once. on_done runs on the writer thread after
+        the transaction commits or fails.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="shared-cache-writer", daemon=True
+                )
+                self._writer.start()
+        self._queue.put((list(statements), on_done))
+
+    def flush(self):
+        """Blocks until every queued write has been committed"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                statements, on_done = item
+                try:
+                    self._execute(statements)
+                except Exception as e:
+                    logger.error(f"Shared cache write of {len(statements)} statements failed: {e}")
+                if on_done is not None:
+                    on_done()
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, statements: list[tuple[str, tuple]]):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        """Commits the queued writes, then closes connections and the leader lock"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        for conn in self._connections:
+            conn.close()
+        self._connections.clear()
+        self._local = threading.local()
+        if self._lock_file is not None:
+            import fcntl
+
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+
+
+class SharedCollectionCache(MutableMapping):
+    """
+    One Firestore collection in a SharedCacheStore, with the CollectionCache
+    interface FirestoreDB relies on.
+
+    Documents are stored pickled and decoded on read, so each worker holds
+    only the documents it is currently using. The collection is a full mirror:
+    size limits in the policy do not apply. Negative-cache entries and
+    hit/miss counters stay per process. Secondary indexes live in the
+    doc_index table and are maintained by whichever process writes.
+
+    Writes are committed by the store's writer thread. Until then this
+    process reads them from _pending, so it always sees its own writes;
+    iteration and len() reflect committed documents only.
+    """
+
+    def __init__(
+        self,
+        store: SharedCacheStore,
+        collection_name: str,
+        policy: Optional[CachePolicy] = None,
+        indexes: Iterable[str] = (),
+    ):
+        self.store = store
+        self.collection_name = collection_name
+        self.policy = policy or CachePolicy(mirrored=True)
+        self._fields: list[str] = []
+        self._missing: dict[str, float] = {}
+        # doc_id -> value (or _DELETED) queued but not yet committed
+        self._pending: dict[str, Any] = {}
+        self._pending_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        for field_path in indexes:
+            if field_path not in self._fields:
+                self._fields.append(field_path)
+
+    def _upsert_statements(self, doc_id: str, value: Any) -> list[tuple[str, tuple]]:
+        collection = self.collection_name
+        statements = [
+            (
+                "INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+            ),
+            ("DELETE FROM doc_index WHERE collection = ? AND doc_id = ?", (collection, doc_id)),
+        ]
+        for field_path in self._fields:
+            field_value = get_field(value, field_path)
+            if isinstance(field_value, Hashable) and field_value is not None:
+                statements.append((
+                    "INSERT OR IGNORE INTO doc_index (collection, field, value, doc_id) "
+                    "VALUES (?, ?, ?, ?)",
+                    (collection, field_path, _index_key(field_value), doc_id),
+                ))
+        return statements
+
+    def _delete_statements(self, doc_id: str) -> list[tuple[str, tuple]]:
+        key = (self.collection_name, doc_id)
+        return [
+            ("DELETE FROM documents WHERE collection = ? AND doc_id = ?", key),
+            ("DELETE FROM doc_index WHERE collection = ? AND doc_id = ?", key),
+        ]
+
+    def _write(self, statements: list[tuple[str, tuple]], changes: dict[str, Any]):
+        """Queues statements; changes stay readable from _pending until they commit"""
+        with self._pending_lock:
+            self._pending.update(changes)
+
+        def committed():
+            with self._pending_lock:
+                for doc_id, value in changes.items():
+                    if self._pending.get(doc_id) is value:
+                        del self._pending[doc_id]
+
+        self.store.write(statements, committed)
+
+    def _get(self, doc_id: str) -> Any:
+        """The document, or _DELETED when this process doesn't see one"""
+        value = self._pending.get(doc_id)
+        if value is not None:
+            return value
+        try:
+            row = self.store.connection().execute(
+                "SELECT data FROM documents WHERE collection = ? AND doc_id = ?",
+                (self.collection_name, doc_id),
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            # Busy past read_timeout: a miss makes the caller go to Firestore
+            logger.warning(f"Shared cache read of {self.collection_name}/{doc_id} failed: {e}")
+            return _DELETED
+        return self._decode(row[0]) if row else _DELETED
+
+    def _decode(self, data: bytes) -> Any:
+        # Every process reads the same form, whichever one wrote the row
+        value = pickle.loads(data)
+        if self.policy.read_only:
+            return freeze(value)
+        return thaw(value) if type(value) is FrozenDict else value
+
+    def __getitem__(self, doc_id: str) -> Any:
+        value = self._get(doc_id)
+        if value is _DELETED:
+            self.misses += 1
+            raise KeyError(doc_id)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, doc_id: str, value: Any):
+        self.put(doc_id, value)
+
+    def put(self, doc_id: str, value: Any) -> Any:
+        """Caches value and returns it the way reads will (see CollectionCache.put)"""
+        if self.policy.read_only:
+            value = freeze(value)
+        self._missing.pop(doc_id, None)
+        self._write(self._upsert_statements(doc_id, value), {doc_id: value})
+        return value
+
+    def __delitem__(self, doc_id: str):
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        self._write(self._delete_statements(doc_id), {doc_id: _DELETED})
+
+    def pop(self, doc_id: str, *default):
+        value = self._get(doc_id)
+        if value is _DELETED:
+            if default:
+                return default[0]
+            raise KeyError(doc_id)
+        self._write(self._delete_statements(doc_id), {doc_id: _DELETED})
+        return value
+
+    def apply_batch(
+        self,
+        upserts: Mapping[str, Any],
+        removals: Iterable[str] = (),
+        only_cached: bool = False,
+    ) -> tuple[int, int]:
+        """Queues one snapshot's changes as a single transaction"""
+        statements = []
+        changes = {}
+        removals = list(removals)
+        for doc_id in removals:
+            statements.extend(self._delete_statements(doc_id))
+            changes[doc_id] = _DELETED
+        for doc_id, value in upserts.items():
+            if self.policy.read_only:
+                value = freeze(value)
+            self._missing.pop(doc_id, None)
+            statements.extend(self._upsert_statements(doc_id, value))
+            changes[doc_id] = value
+        self._write(statements, changes)
+        return len(upserts), len(removals)
+
+    def mark_missing(self, doc_id: str):
+        ttl = self.policy.negative_ttl_seconds
+        if ttl and doc_id not in self:
+            self._missing[doc_id] = time.monotonic() + ttl
+
+    def clear_missing(self, doc_id: str):
+        self._missing.pop(doc_id, None)
+
+    def is_known_missing(self, doc_id: str) -> bool:
+        expires_at = self._missing.get(doc_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            self._missing.pop(doc_id, None)
+            return False
+        self.negative_hits += 1
+        return True
+
+    def add_index(self, field_path: str):
+        """Declares a secondary index and builds it from the stored documents"""
+        if field_path in self._fields:
+            return
+        self._fields.append(field_path)
+        statements = []
+        for doc_id, value in self.items():
+            field_value = get_field(value, field_path)
+            if isinstance(field_value, Hashable) and field_value is not None:
+                statements.append((
+                    "INSERT OR IGNORE INTO doc_index (collection, field, value, doc_id) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.collection_name, field_path, _index_key(field_value), doc_id),
+                ))
+        self.store.write(statements)
+
+    @property
+    def indexes(self) -> list[str]:
+        return list(self._fields)
+
+    def lookup(self, field_path: str, value: Any) -> list:
+        if field_path not in self._fields:
+            raise KeyError(field_path)
+        rows = self.store.connection().execute(
+            "SELECT d.doc_id, d.data FROM doc_index i JOIN documents d "
+            "ON d.collection = i.collection AND d.doc_id = i.doc_id "
+            "WHERE i.collection = ? AND i.field = ? AND i.value = ?",
+            (self.collection_name, field_path, _index_key(value)),
+        ).fetchall()
+        with self._pending_lock:
+            pending = dict(self._pending)
+        found = [self._decode(data) for doc_id, data in rows if doc_id not in pending]
+        found.extend(
+            document
+            for document in pending.values()
+            if document is not _DELETED and get_field(document, field_path) == value
+        )
+        return found
+
+    def __contains__(self, doc_id: object) -> bool:
+        value = self._pending.get(doc_id)
+        if value is not None:
+            return value is not _DELETED
+        try:
+            return self.store.connection().execute(
+                "SELECT 1 FROM documents WHERE collection = ? AND doc_id = ?",
+                (self.collection_name, doc_id),
+            ).fetchone() is not None
+        except sqlite3.OperationalError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self.store.connection().execute(
+            "SELECT doc_id FROM documents WHERE collection = ?", (self.collection_name,)
+        ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        return self.store.connection().execute(
+            "SELECT COUNT(*) FROM documents WHERE collection = ?", (self.collection_name,)
+        ).fetchone()[0]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def items(self):
+        rows = self.store.connection().execute(
+            "SELECT doc_id, data FROM documents WHERE collection = ?", (self.collection_name,)
+        ).fetchall()
+        return [(doc_id, self._decode(data)) for doc_id, data in rows]
+
+    def clear(self):
+        key = (self.collection_name,)
+        self._missing.clear()
+        with self._pending_lock:
+            self._pending.clear()
+        self.store.write([
+            ("DELETE FROM documents WHERE collection = ?", key),
+            ("DELETE FROM doc_index WHERE collection = ?", key),
+            ("DELETE FROM collections WHERE collection = ?", key),
+        ])
+
+    def mark_ready(self, read_time: Any):
+        """Publishes that the collection is loaded and consistent with read_time"""
+        self.store.write([(
+            "INSERT OR REPLACE INTO collections (collection, ready, read_time) VALUES (?, 1, ?)",
+            (self.collection_name, pickle.dumps(read_time)),
+        )])
+
+    def is_published(self) -> bool:
+        row = self.store.connection().execute(
+            "SELECT ready FROM collections WHERE collection = ?", (self.collection_name,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def read_time(self) -> Any:
+        row = self.store.connection().execute(
+            "SELECT read_time FROM collections WHERE collection = ?", (self.collection_name,)
+        ).fetchone()
+        return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "bytes": None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "negative_entries": len(self._missing),
+            "negative_hits": self.negative_hits,
+            "evictions": 0,
+            "expirations": 0,
+            "shared": True,
+            "leader": self.store.is_leader,
+        }
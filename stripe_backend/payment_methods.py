@@ -29,12 +29,8 @@ async def create_payment_method(
     stripe.PaymentMethod.attach(payment_method.id, customer=customer["customer_id"])
 
     # Optionally store the payment method in the database for future use
-    query = """
-    INSERT INTO stripe_payment_methods (payment_method_id, user_id, customer_id, type, billing_details)
-    VALUES ($1, $2, $3, $4, $5) RETURNING *
-    """
-    payment_method_record = await Database.execute(
-        query,
+    payment_method_record = await Database.execute_named(
+        "insert_stripe_payment_method",
         payment_method.id,
         user_id,
         customer["customer_id"],
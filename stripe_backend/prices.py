@@ -39,16 +39,11 @@ async def create_price(price_req: PriceReq, product_req: ProductReq) -> PriceRes
     else:
         raise ValueError("Invalid pricing type")
 
-    query = """
-    INSERT INTO prices (
-        price_id, product_id
-    ) VALUES ($1, $2) RETURNING *
-    """
     created_at = datetime.now()
     updated_at = created_at
 
-    price = await Database.execute(
-        query,
+    price = await Database.execute_named(
+        "insert_price",
         stripe_price.id,
         product_req.id,
     )
@@ -65,8 +60,7 @@ async def create_price(price_req: PriceReq, product_req: ProductReq) -> PriceRes
 
 # List all prices
 async def list_prices() -> list[PriceRes]:
-    query = "SELECT * FROM prices"
-    prices = await Database.fetch_all(query)
+    prices = await Database.fetch_named("list_prices")
     return [PriceRes(**price) for price in prices]
 
 
@@ -104,24 +98,10 @@ async def update_price(price_id: str, price_req: PriceReq) -> PriceRes:
     else:
         raise ValueError("Invalid pricing type")
 
-    query = """
-    UPDATE prices
-    SET
-        currency = $1,
-        unit_amount = $2,
-        base_amount = $3,
-        included_seats = $4,
-        additional_seat_price = $5,
-        recurring_interval = $6,
-        recurring_interval_count = $7,
-        updated_at = $8
-    WHERE price_id = $9
-    RETURNING *
-    """
     updated_at = datetime.now()
 
-    price = await Database.execute(
-        query,
+    price = await Database.execute_named(
+        "update_price",
         price_req.currency,
         price_req.unit_amount,
         price_req.base_amount,
@@ -140,8 +120,7 @@ async def update_price(price_id: str, price_req: PriceReq) -> PriceRes:
 async def delete_price(price_id: str) -> None:
     stripe.Price.delete(price_id)
 
-    query = "DELETE FROM prices WHERE price_id = $1"
-    await Database.execute(query, price_id)
+    await Database.execute_named("delete_price", price_id)
 
 
 # add a new seat
@@ -160,18 +139,10 @@ async def add_seat_to_price(price_id: str, seats: int) -> PriceRes:
         ],
     )
 
-    query = """
-    UPDATE prices
-    SET
-        included_seats = $1,
-        updated_at = $2
-    WHERE price_id = $3
-    RETURNING *
-    """
     updated_at = datetime.now()
 
-    price = await Database.execute(
-        query, updated_price["tiers"][-1]["up_to"], updated_at, price_id
+    price = await Database.execute_named(
+        "update_price_seats", updated_price["tiers"][-1]["up_to"], updated_at, price_id
     )
 
     return PriceRes(**price)
@@ -32,8 +32,7 @@ async def create_stripe_product(req: ProductReq) -> dict:
     # change the attributes inside the product to a dict
     product_json = dict(product)
     try:
-        query = f"INSERT INTO Stripe_Products (product_id) VALUES ('{product.id}') RETURNING *"
-        await Database.execute(query)
+        await Database.execute_named("insert_stripe_product", product.id)
     except Exception as e:
         print(e)
         raise HTTPException(status_code=404, detail="Unable to create product row")
@@ -52,8 +51,7 @@ async def create_stripe_product(req: ProductReq) -> dict:
 
 
 async def update_stripe_product(product_id: str, req: ProductReq) -> ProductRes:
-    query = "SELECT * FROM Stripe_Products WHERE product_id = $1"
-    product_db = await Database.fetchrow(query, product_id)
+    product_db = await Database.fetchrow_named("select_stripe_product", product_id)
     if not product_db:
         raise HTTPException(status_code=404, detail="Product not found")
     metadata = req.metadata if isinstance(req.metadata, dict) else req.metadata.dict()
@@ -79,8 +77,7 @@ async def delete_stripe_product(product_id: str) -> dict:
     # Delete an existing product in Stripe
     response = stripe.Product.modify(product_id, active=False)
     try:
-        sql = "DELETE FROM Stripe_Products WHERE product_id = $1"
-        await Database.execute(sql, product_id)
+        await Database.execute_named("delete_stripe_product", product_id)
     except Exception as e:
         print(e)
         raise HTTPException(status_code=404, detail="Product")
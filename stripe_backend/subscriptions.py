@@ -46,9 +46,8 @@ async def create_subscription(
     )
 
     # Store subscription details in your database (Optional)
-    query = "INSERT INTO stripe_subscriptions (subscription_id, user_id, product_id) VALUES ($1, $2, $3)"
-    await Database.execute(
-        query,
+    await Database.execute_named(
+        "insert_stripe_subscription",
         subscription.id,
         subscription_req.user_id,
         subscription_req.product_id,
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import random
+
+import pytest
+from starlette.requests import Request
+
+from backend_common.common_config import CONF
+from backend_common.request_body import _top_level_user_id, extract_user_id
+
+PAD = "x" * 100_000
+
+# Bodies where a naive scan for '"user_id":' disagrees with json.loads
+HOSTILE_BODIES = [
+    '{"user_id":"victim","pad":"%s","foo \\"user_id": "attacker"}' % PAD,
+    '{"pad":"%s","user_id":"victim","a\\\\\\"user_id":"attacker"}' % PAD,
+    '{"user_id":"victim","pad":"%s","note":"\\"user_id\\": \\"attacker\\""}' % PAD,
+    '{"user_id":"victim","pad":"%s","\\u0075ser_id":"attacker"}' % PAD,
+    '{"pad":"%s","user\\u005fid":"attacker"}' % PAD,
+    '{"user_id":"victim","pad":"%s","nested":{"user_id":"attacker"}}' % PAD,
+    '{"pad":"%s","list":[{"user_id":"attacker"}],"user_id":"victim"}' % PAD,
+    '{"user_id":"attacker","pad":"%s","user_id":"victim"}' % PAD,
+    '{"pad":"%s","s":"}]","user_id":"victim","t":"[{","o":{"user_id":"attacker"}}' % PAD,
+    '{"pad":"%s","s":"\\\\","user_id":"victim"}' % PAD,
+    '{"pad":"%s","user_id":"vic\\"tim"}' % PAD,
+    '{"pad":"%s","user_id":null}' % PAD,
+]
+
+
+def make_request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+
+@pytest.fixture(autouse=True)
+def always_scan(monkeypatch):
+    monkeypatch.setattr(CONF, "request_body_scan_threshold", 0)
+
+
+@pytest.mark.parametrize("body", HOSTILE_BODIES, ids=lambda body: body.replace(PAD, "..."))
+def test_extract_user_id_matches_json_loads(body):
+    expected = json.loads(body).get("user_id")
+    assert asyncio.run(extract_user_id(make_request(body.encode()))) == expected
+
+
+def test_extract_user_id_rejects_malformed_body():
+    with pytest.raises(json.JSONDecodeError):
+        asyncio.run(extract_user_id(make_request(b'{"pad":"%s","user_id":' % PAD.encode())))
+
+
+def random_value(rng: random.Random, depth: int):
+    kind = rng.randrange(6 if depth < 4 else 3)
+    if kind == 0:
+        return rng.choice(["user_id", '"user_id":', "{[", "]}", "", "a b"])
+    if kind == 1:
+        return rng.randrange(100)
+    if kind == 2:
+        return rng.choice([None, True, False])
+    if kind in (3, 4):
+        keys = ["user_id", "a", "b", "user_id ", "x"]
+        return {rng.choice(keys): random_value(rng, depth + 1) for _ in range(rng.randrange(4))}
+    return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+
+
+def test_scan_matches_json_loads_on_random_documents():
+    rng = random.Random(0)
+    for _ in range(2000):
+        document = random_value(rng, 0)
+        if not isinstance(document, dict):
+            continue
+        body = json.dumps(document, separators=rng.choice([(",", ":"), (", ", ": ")]))
+        if "\\" in body:
+            continue
+        found, user_id = _top_level_user_id(body.encode())
+        assert found == ("user_id" in document), body
+        assert user_id == document.get("user_id"), body
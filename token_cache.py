@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from backend_common.common_config import CONF
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of decoded Firebase ID-token claims.
+
+    Entries are keyed by a SHA-256 hash of the raw token (the token itself is
+    never stored) and expire at the token's own "exp" claim. All operations
+    take a lock because verification may run on worker threads.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Returns the cached claims for token, or None on a miss or when the
+        token has expired since it was cached.
+        """
+        key = self.key_for(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: dict):
+        """
+        Caches verified claims until the token's "exp" claim.
+        """
+        expires_at = claims.get("exp")
+        if not expires_at or expires_at <= time.time():
+            return
+        key = self.key_for(token)
+        with self._lock:
+            self._entries[key] = (float(expires_at), claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self.key_for(token), None)
+
+    def invalidate_uid(self, uid: str):
+        """
+        Drops every cached token issued to uid, e.g. after its refresh
+        tokens were revoked.
+        """
+        with self._lock:
+            stale = [k for k, (_, claims) in self._entries.items() if claims.get("uid") == uid]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+id_token_cache = VerifiedTokenCache(CONF.id_token_cache_max_entries)
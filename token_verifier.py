@@ -0,0 +1,204 @@
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import firebase_admin
+from firebase_admin import auth
+from google.auth import jwt
+
+from backend_common.common_config import CONF
+from backend_common.firebase_backend import get_backend
+from backend_common.http_client import FirebaseHttpClient
+from backend_common.logger import logging
+
+logger = logging.getLogger(__name__)
+
+ID_TOKEN_CERT_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+
+def verify_token_with_certs(token: str, certs: dict, project_id: str) -> tuple[str, object]:
+    """
+    Verifies a Firebase ID token against an already fetched certificate set.
+
+    Runs inside worker threads or processes, so it only takes plain values and
+    returns a picklable (status, value) tuple instead of raising:
+    ("ok", claims), ("expired", message), ("unknown_kid", message) or
+    ("invalid", message). The claim checks mirror firebase_admin.auth.
+    """
+    try:
+        header = jwt.decode_header(token)
+        payload = jwt.decode(token, verify=False)
+    except ValueError as e:
+        return "invalid", str(e)
+
+    subject = payload.get("sub")
+    if not header.get("kid"):
+        return "invalid", 'Firebase ID token has no "kid" claim.'
+    if header.get("alg") != "RS256":
+        return "invalid", f'Firebase ID token has incorrect algorithm "{header.get("alg")}".'
+    if payload.get("aud") != project_id:
+        return "invalid", f'Firebase ID token has incorrect "aud" claim "{payload.get("aud")}".'
+    if payload.get("iss") != ID_TOKEN_ISSUER_PREFIX + project_id:
+        return "invalid", f'Firebase ID token has incorrect "iss" claim "{payload.get("iss")}".'
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        return "invalid", 'Firebase ID token has an invalid "sub" claim.'
+    if header["kid"] not in certs:
+        return "unknown_kid", f"Certificate for key id {header['kid']} not found."
+
+    try:
+        claims = jwt.decode(token, certs=certs, audience=project_id)
+    except ValueError as e:
+        if "Token expired" in str(e):
+            return "expired", str(e)
+        return "invalid", str(e)
+    claims["uid"] = claims["sub"]
+    return "ok", claims
+
+
+class TokenVerifierPool:
+    """
+    Runs ID-token signature verification off the event loop.
+
+    CONF.id_token_verify_mode selects where verification runs:
+      - "inline": firebase_admin.auth.verify_id_token on the calling thread
+      - "thread": a ThreadPoolExecutor of CONF.id_token_verify_workers
+      - "process": a ProcessPoolExecutor of CONF.id_token_verify_workers
+
+    In the pooled modes the Google public certificates are prefetched and
+    refreshed by a background task, so the request path never fetches them.
+    Revocation checks still go through firebase_admin on a thread.
+    """
+
+    executor: Optional[Executor] = None
+    certs: dict[str, str] = {}
+    certs_expire_at: float = 0
+    _refresh_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def mode(cls) -> str:
+        return CONF.id_token_verify_mode
+
+    @classmethod
+    async def start(cls):
+        """
+        Creates the worker pool and starts the certificate refresher.
+        """
+        if cls.mode() == "inline" or cls.executor is not None:
+            return
+        if cls.mode() == "process":
+            cls.executor = ProcessPoolExecutor(max_workers=CONF.id_token_verify_workers)
+        else:
+            cls.executor = ThreadPoolExecutor(
+                max_workers=CONF.id_token_verify_workers,
+                thread_name_prefix="id-token-verify",
+            )
+        try:
+            await cls.refresh_certs()
+        except Exception as e:
+            logger.warning(f"Initial ID-token certificate fetch failed: {e}")
+        cls._refresh_task = asyncio.create_task(cls._refresh_loop())
+        logger.info(
+            f"Started ID-token verifier in {cls.mode()} mode "
+            f"with {CONF.id_token_verify_workers} workers"
+        )
+
+    @classmethod
+    async def stop(cls):
+        """
+        Stops the certificate refresher and shuts the worker pool down.
+        """
+        if cls._refresh_task is not None:
+            cls._refresh_task.cancel()
+            try:
+                await cls._refresh_task
+            except asyncio.CancelledError:
+                pass
+            cls._refresh_task = None
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+
+    @classmethod
+    async def refresh_certs(cls):
+        """
+        Fetches the current Google public certificates and records their
+        expiry from the Cache-Control max-age.
+        """
+        client = await FirebaseHttpClient.get_client()
+        response = await client.get(ID_TOKEN_CERT_URL)
+        response.raise_for_status()
+        max_age = 3600
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        if match:
+            max_age = int(match.group(1))
+        cls.certs = response.json()
+        cls.certs_expire_at = time.time() + max_age
+        logger.info(f"Refreshed {len(cls.certs)} ID-token certificates, max-age {max_age}s")
+
+    @classmethod
+    async def _refresh_loop(cls):
+        while True:
+            delay = cls.certs_expire_at - time.time() - CONF.id_token_certs_refresh_margin
+            await asyncio.sleep(max(delay, 30))
+            try:
+                await cls.refresh_certs()
+            except Exception as e:
+                logger.warning(f"ID-token certificate refresh failed: {e}")
+
+    @staticmethod
+    def _project_id() -> Optional[str]:
+        try:
+            return firebase_admin.get_app().project_id
+        except ValueError:
+            return None
+
+    @classmethod
+    async def verify(cls, token: str, check_revoked: bool = False) -> dict:
+        """
+        Verifies token and returns its claims.
+
+        Raises the same firebase_admin.auth errors as auth.verify_id_token.
+        """
+        if cls.mode() == "inline":
+            return get_backend().admin_auth().verify_id_token(token, check_revoked=check_revoked)
+
+        project_id = cls._project_id()
+        if (
+            # Not started, e.g. an app that doesn't use common_endpoints' lifespan
+            cls.executor is None
+            or check_revoked
+            or not cls.certs
+            or not project_id
+            or os.getenv("FIREBASE_AUTH_EMULATOR_HOST")
+        ):
+            # firebase_admin state cannot cross a process boundary, so this
+            # path always uses a thread.
+            return await asyncio.to_thread(
+                get_backend().admin_auth().verify_id_token, token, check_revoked=check_revoked
+            )
+
+        loop = asyncio.get_running_loop()
+        result, value = await loop.run_in_executor(
+            cls.executor, verify_token_with_certs, token, cls.certs, project_id
+        )
+        if result == "unknown_kid":
+            # Keys rotated since the last refresh
+            try:
+                await cls.refresh_certs()
+                result, value = await loop.run_in_executor(
+                    cls.executor, verify_token_with_certs, token, cls.certs, project_id
+                )
+            except Exception as e:
+                logger.warning(f"ID-token certificate refresh failed: {e}")
+        if result == "ok":
+            return value
+        if result == "expired":
+            raise auth.ExpiredIdTokenError(value, cause=None)
+        raise auth.InvalidIdTokenError(value)